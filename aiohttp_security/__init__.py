@@ -1,16 +1,33 @@
 from .abc import AbstractAuthorizationPolicy, AbstractIdentityPolicy
-from .api import (authorized_userid, check_authorized, check_permission, forget,
-                  is_anonymous, permits, remember, setup)
+from .acl import (ACLAuthorizationPolicy, ALL_PERMISSIONS, Allow, Authenticated, DENY_ALL,
+                  Deny, Everyone)
+from .api import (authorized_userid, check_authorized, check_permission, check_permissions,
+                  forget, is_anonymous, permits, permits_many, remember, setup)
+from .cache import CachedAuthorizationPolicy
+from .composite_identity import CompositeIdentityPolicy
 from .cookies_identity import CookiesIdentityPolicy
+from .flags import FlagAuthorizationPolicy, load_flags
 from .jwt_identity import JWTIdentityPolicy
+from .metrics import AbstractMetricsSink, InMemoryMetrics
+from .middleware import requires, setup_middleware, setup_server_timing
+from .parallel_authorization import ParallelAuthorizationPolicy
+from .profiling import SlowCallProfiler
+from .rbac import RBACAuthorizationPolicy
 from .session_identity import SessionIdentityPolicy
+from .wildcard import PermissionTrie, WildcardAuthorizationPolicy
 
 __version__ = '0.5.0'
 
 
 __all__ = ('AbstractIdentityPolicy', 'AbstractAuthorizationPolicy',
            'CookiesIdentityPolicy', 'SessionIdentityPolicy',
-           'JWTIdentityPolicy',
+           'JWTIdentityPolicy', 'CompositeIdentityPolicy', 'CachedAuthorizationPolicy',
+           'ParallelAuthorizationPolicy', 'RBACAuthorizationPolicy',
+           'WildcardAuthorizationPolicy', 'PermissionTrie',
+           'FlagAuthorizationPolicy', 'load_flags', 'ACLAuthorizationPolicy',
+           'Allow', 'Deny', 'Everyone', 'Authenticated', 'ALL_PERMISSIONS', 'DENY_ALL',
+           'AbstractMetricsSink', 'InMemoryMetrics', 'SlowCallProfiler',
            'remember', 'forget', 'authorized_userid',
-           'permits', 'setup', 'is_anonymous',
-           'check_authorized', 'check_permission')
+           'permits', 'permits_many', 'setup', 'is_anonymous',
+           'check_authorized', 'check_permission', 'check_permissions',
+           'requires', 'setup_middleware', 'setup_server_timing')
@@ -1,6 +1,7 @@
 import abc
+import asyncio
 from enum import Enum
-from typing import Any, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from aiohttp import web
 
@@ -33,6 +34,16 @@ class AbstractIdentityPolicy(metaclass=abc.ABCMeta):
         current identity on subsequent requests."""
         pass
 
+    def has_credentials(self, request: web.Request) -> bool:
+        """Tell whether the request may carry credentials of this policy.
+
+        A cheap check, e.g. for a cookie or header presence, done
+        without verifying anything. Return False only if identify()
+        would certainly return None. The default implementation always
+        returns True.
+        """
+        return True
+
 
 class AbstractAuthorizationPolicy(metaclass=abc.ABCMeta):
 
@@ -54,3 +65,57 @@ class AbstractAuthorizationPolicy(metaclass=abc.ABCMeta):
         or 'None' if no user exists related to the identity.
         """
         pass
+
+    async def permits_many(self, identity: Optional[str],
+                           permissions: Iterable[Union[str, Enum]],
+                           context: Any = None) -> Dict[Union[str, Enum], bool]:
+        """Check several user permissions at once.
+
+        Return a mapping of every requested permission to the result
+        permits() would return for it. The default implementation calls
+        permits() concurrently, policies able to answer in bulk (e.g.
+        with a single database query) should override it.
+        """
+        perms = _unique(permissions)
+        results = await asyncio.gather(*(self.permits(identity, p, context)
+                                         for p in perms))
+        return _combine(zip(perms, results))
+
+
+# Members of different enums, e.g. of two IntFlag classes with the same
+# value, or a str-mixin member and a plain string may compare equal
+# while being different permissions. They are told apart by type, and
+# never given to a policy in the same permits_many() call as the
+# mapping it returns could not hold both.
+
+def _unique(permissions: Iterable[Union[str, Enum]]) -> List[Union[str, Enum]]:
+    """Return *permissions* without duplicates, in order."""
+    return list({(type(p), p): p for p in permissions}.values())
+
+
+def _batches(permissions: List[Union[str, Enum]]) -> List[List[Union[str, Enum]]]:
+    """Split unique *permissions* into batches without equal ones."""
+    batches: List[List[Union[str, Enum]]] = []
+    seen: List[Set[Union[str, Enum]]] = []
+    for permission in permissions:
+        index = next((i for i, keys in enumerate(seen) if permission not in keys),
+                     len(batches))
+        if index == len(batches):
+            batches.append([])
+            seen.append(set())
+        batches[index].append(permission)
+        seen[index].add(permission)
+    return batches
+
+
+def _combine(decisions: Iterable[Tuple[Union[str, Enum], bool]]
+             ) -> Dict[Union[str, Enum], bool]:
+    """Return a mapping of permissions to their decisions.
+
+    Equal permissions of different types share an entry, True only if
+    every one of them is granted.
+    """
+    combined: Dict[Union[str, Enum], bool] = {}
+    for permission, access in decisions:
+        combined[permission] = combined.get(permission, True) and access
+    return combined
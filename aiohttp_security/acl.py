@@ -0,0 +1,173 @@
+"""Access control lists in the style of Pyramid.
+
+The context passed to permits() carries an ``__acl__``, a sequence of
+access control entries ``(action, principal, permissions)``: the first
+entry whose principal is one of the user's and whose permissions
+include the checked one decides. Contexts without a decision defer to
+their ``__parent__``, and permission is denied when no entry matches.
+
+The ``__acl__`` of a context class is compiled once into a table
+mapping each permission to the position and action of the first entry
+of every principal, and cached per class; a check then costs a lookup
+per principal of the user. An ``__acl__`` set on an instance is checked
+before the one of its class, entry by entry, so only these additions
+are evaluated on every call. An ``__acl__`` computed per instance, by
+a method or a property, is scanned on every check.
+
+"""
+
+import weakref
+from enum import Enum
+from typing import (Any, Awaitable, Callable, Collection, Dict, Iterable, Optional, Sequence,
+                    Set, Tuple, Union)
+
+from .abc import AbstractAuthorizationPolicy
+
+Allow = "Allow"
+Deny = "Deny"
+
+Everyone = "system.Everyone"
+Authenticated = "system.Authenticated"
+
+
+class _AllPermissions:
+
+    def __contains__(self, permission: object) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        return "ALL_PERMISSIONS"
+
+
+ALL_PERMISSIONS = _AllPermissions()
+
+DENY_ALL = (Deny, Everyone, ALL_PERMISSIONS)
+
+Permission = Union[str, Enum]
+ACE = Tuple[str, str, Any]
+# principal -> (position of its first entry, whether that entry allows)
+_Table = Dict[str, Tuple[int, bool]]
+
+
+def _permissions(ace: ACE) -> Union[_AllPermissions, Collection[Permission]]:
+    action, principal, permissions = ace
+    if action not in (Allow, Deny):
+        raise ValueError("ACE action should be Allow or Deny: {!r}".format(ace))
+    if isinstance(permissions, (str, Enum)):
+        return (permissions,)
+    if isinstance(permissions, _AllPermissions):
+        return permissions
+    return tuple(permissions)
+
+
+class _CompiledACL:
+
+    __slots__ = ("acl", "tables", "fallback")
+
+    def __init__(self, acl: Sequence[ACE]):
+        self.acl = acl
+        self.tables: Dict[Permission, _Table] = {}
+        # entries granting or denying all permissions, for permissions
+        # no entry names
+        self.fallback: _Table = {}
+        for position, ace in enumerate(acl):
+            action, principal, _ = ace
+            permissions = _permissions(ace)
+            entry = (position, action == Allow)
+            if isinstance(permissions, _AllPermissions):
+                self.fallback.setdefault(principal, entry)
+                for table in self.tables.values():
+                    table.setdefault(principal, entry)
+                continue
+            for permission in permissions:
+                if permission not in self.tables:
+                    self.tables[permission] = dict(self.fallback)
+                self.tables[permission].setdefault(principal, entry)
+
+    def decide(self, principals: Set[str], permission: Permission) -> Optional[bool]:
+        table = self.tables.get(permission, self.fallback)
+        entries = [table[p] for p in principals if p in table]
+        return min(entries)[1] if entries else None
+
+
+def _scan(acl: Iterable[ACE], principals: Set[str], permission: Permission) -> Optional[bool]:
+    for ace in acl:
+        if ace[1] in principals and permission in _permissions(ace):
+            return ace[0] == Allow
+    return None
+
+
+class ACLAuthorizationPolicy(AbstractAuthorizationPolicy):
+    """Authorization policy checking permissions against the ``__acl__``
+    of the context.
+
+    The principals of a user are :data:`Everyone`, and for identified
+    users :data:`Authenticated`, the identity and the groups returned
+    by the *groupfinder* coroutine function. *groupfinder* returns None
+    for unknown users; without it every identity is a user without
+    groups.
+    """
+
+    def __init__(self, groupfinder: Optional[
+            Callable[[str], Awaitable[Optional[Iterable[str]]]]] = None):
+        self.groupfinder = groupfinder
+        self._compiled: "weakref.WeakKeyDictionary[type, _CompiledACL]" = (
+            weakref.WeakKeyDictionary())
+
+    async def authorized_userid(self, identity: str) -> Optional[str]:
+        if self.groupfinder is None or await self.groupfinder(identity) is not None:
+            return identity
+        return None
+
+    async def principals(self, identity: Optional[str]) -> Set[str]:
+        """Return the principals of *identity*."""
+        principals = {Everyone}
+        if identity is None:
+            return principals
+        groups = None if self.groupfinder is None else await self.groupfinder(identity)
+        if self.groupfinder is None or groups is not None:
+            principals.add(Authenticated)
+            principals.add(identity)
+            principals.update(groups or ())
+        return principals
+
+    async def permits(self, identity: Optional[str], permission: Permission,
+                      context: Any = None) -> bool:
+        if context is None:
+            return False
+        return self._permits(await self.principals(identity), permission, context)
+
+    async def permits_many(self, identity: Optional[str], permissions: Iterable[Permission],
+                           context: Any = None) -> Dict[Permission, bool]:
+        if context is None:
+            return dict.fromkeys(permissions, False)
+        principals = await self.principals(identity)
+        return {p: self._permits(principals, p, context) for p in permissions}
+
+    def _permits(self, principals: Set[str], permission: Permission, context: Any) -> bool:
+        while context is not None:
+            decision = self._decide(context, principals, permission)
+            if decision is not None:
+                return decision
+            context = getattr(context, "__parent__", None)
+        return False
+
+    def _decide(self, context: Any, principals: Set[str],
+                permission: Permission) -> Optional[bool]:
+        own = getattr(context, "__dict__", {}).get("__acl__")
+        if own is not None:
+            decision = _scan(own, principals, permission)
+            if decision is not None:
+                return decision
+        cls = type(context)
+        acl = getattr(cls, "__acl__", None)
+        if acl is None:
+            return None
+        if not isinstance(acl, (list, tuple)):
+            # computed per instance, e.g. by a method or a property
+            acl = context.__acl__
+            return _scan(acl() if callable(acl) else acl, principals, permission)
+        compiled = self._compiled.get(cls)
+        if compiled is None or compiled.acl is not acl:
+            compiled = self._compiled[cls] = _CompiledACL(acl)
+        return compiled.decide(principals, permission)
@@ -1,16 +1,179 @@
+import asyncio
 import enum
-from typing import Any, Optional, Union
+import time
+from typing import (Any, Awaitable, Callable, Dict, Hashable, Iterable, List, NamedTuple,
+                    NewType, Optional, Tuple, TypeVar, Union, cast)
 
 from aiohttp import web
 
-from aiohttp_security.abc import AbstractAuthorizationPolicy, AbstractIdentityPolicy
+from aiohttp_security.abc import (AbstractAuthorizationPolicy, AbstractIdentityPolicy,
+                                  _batches, _combine, _unique)
+from aiohttp_security.metrics import (AbstractMetricsSink, InstrumentedAuthorizationPolicy,
+                                      InstrumentedIdentityPolicy)
+from aiohttp_security.profiling import SlowCallProfiler
+
+
+# Identity resolved by identity_policy.identify() is memoized on the request
+# under this key, so every api call made while handling a request shares
+# a single identify() result. While identify() is in flight the key holds
+# a future, concurrent callers await it instead of calling identify() again.
+IDENTITY_CACHE_KEY = "aiohttp_security_identity"
+# authorized_userid() and permits() decisions are memoized the same way,
+# unless setup() was called with cache_decisions=False.
+USERID_CACHE_KEY = "aiohttp_security_userid"
+PERMITS_CACHE_KEY = "aiohttp_security_permits"
+# The actual request keys are these suffixed by the identity policy, or
+# the security context, they belong to: applications nested with other
+# policies never share memos.
+_MEMO_PREFIXES = tuple(key + "_"
+                       for key in (IDENTITY_CACHE_KEY, USERID_CACHE_KEY, PERMITS_CACHE_KEY))
+# Set by the security middleware on requests under a public path, which
+# are anonymous whatever the identity policy.
+PUBLIC_KEY = "aiohttp_security_public"
+
+
+class SecurityContext:
+    """Policies and options of an application, as passed to setup().
+
+    cache_decisions and profiler, when not given to setup() of a
+    sub-application, are inherited from the parent application at
+    startup; cache_decisions left None everywhere means True. Metrics
+    wrap the policies given to setup() and are not inherited.
+    """
+
+    __slots__ = ("identity_policy", "autz_policy", "cache_decisions", "profiler",
+                 "identity_key", "userid_key", "permits_key")
+
+    def __init__(self, identity_policy: AbstractIdentityPolicy,
+                 autz_policy: AbstractAuthorizationPolicy,
+                 cache_decisions: Optional[bool],
+                 profiler: Optional[SlowCallProfiler]):
+        self.identity_policy = identity_policy
+        self.autz_policy = autz_policy
+        self.cache_decisions = cache_decisions
+        self.profiler = profiler
+        self.identity_key = "{}_{}".format(IDENTITY_CACHE_KEY, id(identity_policy))
+        self.userid_key = "{}_{}".format(USERID_CACHE_KEY, id(self))
+        self.permits_key = "{}_{}".format(PERMITS_CACHE_KEY, id(self))
+
 
 IDENTITY_KEY = web.AppKey("IDENTITY_KEY", AbstractIdentityPolicy)
 AUTZ_KEY = web.AppKey("AUTZ_KEY", AbstractAuthorizationPolicy)
+CONTEXT_KEY = web.AppKey("CONTEXT_KEY", SecurityContext)
+
+# The effective SecurityContext of a request is looked up in its
+# config_dict, which walks the application currently handling it and
+# those enclosing it, once per application and kept on the request
+# under this key, in a dict keyed by application: the middlewares of a
+# parent application run before those of the sub-application routing
+# the request and see its parent's context.
+CONTEXT_CACHE_KEY = "aiohttp_security_context"
+
+# Set to a list by the Server-Timing middleware, every policy call made
+# while handling the request is then timed and appended to it.
+TIMINGS_KEY = "aiohttp_security_timings"
+
+# permits() decisions are keyed by the type of the permission as well,
+# members of different enums or str-mixin members and plain strings may
+# compare equal while being different permissions
+_PermitsKey = Tuple[Optional[str], type, Union[str, enum.Enum], Hashable]
+
+_Sentinel = NewType("_Sentinel", object)
+sentinel = _Sentinel(object())
+
+_T = TypeVar("_T")
+
+
+def _context(request: web.Request) -> Optional[SecurityContext]:
+    contexts = request.get(CONTEXT_CACHE_KEY)
+    if contexts is None:
+        contexts = request[CONTEXT_CACHE_KEY] = {}
+    app = request.app
+    security = contexts.get(app, sentinel)
+    if security is sentinel:
+        security = contexts[app] = request.config_dict.get(CONTEXT_KEY)
+    return cast(Optional[SecurityContext], security)
 
-# _AIP/_AAP are shorthand for Optional[policy] when we retrieve from request.
-_AAP = Optional[AbstractAuthorizationPolicy]
-_AIP = Optional[AbstractIdentityPolicy]
+
+class Timing(NamedTuple):
+    name: str
+    duration: float  # seconds
+    description: str
+
+
+def _describe(permission: Union[str, enum.Enum]) -> str:
+    if isinstance(permission, enum.Enum):
+        # flags combined or with unnamed bits have no name before
+        # Python 3.11, the latter not even since
+        return permission.name or str(permission)
+    return permission
+
+
+async def _timed(request: web.Request, security: SecurityContext, name: str,
+                 call: Awaitable[_T], *permissions: Union[str, enum.Enum]) -> _T:
+    # every policy call made by the api goes through here
+    timings: Optional[List[Timing]] = request.get(TIMINGS_KEY)
+    profiler = security.profiler
+    if profiler is not None:
+        call = profiler.watch(request, call, ", ".join(map(repr, permissions)))
+    if timings is None:
+        return await call
+    started = time.perf_counter()
+    try:
+        return await call
+    finally:
+        description = ",".join(map(_describe, permissions))
+        timings.append(Timing(name, time.perf_counter() - started, description))
+
+
+async def _memoize(request: web.Request, key: str,
+                   resolve: Callable[[], Awaitable[Any]]) -> Any:
+    value = request.get(key, sentinel)
+    if isinstance(value, asyncio.Future):
+        try:
+            return await asyncio.shield(value)
+        except asyncio.CancelledError:
+            if not value.cancelled():
+                raise  # the awaiting task itself was cancelled
+            # the task resolving the value was cancelled, start over
+            return await _memoize(request, key, resolve)
+    if value is not sentinel:
+        return value
+
+    fut: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+    request[key] = fut
+    try:
+        value = await resolve()
+    except BaseException as exc:
+        if request.get(key) is fut:
+            del request[key]  # failures are not memoized
+        if isinstance(exc, asyncio.CancelledError):
+            fut.cancel()
+        else:
+            fut.set_exception(exc)
+            fut.exception()  # retrieved by waiters, if any
+        raise
+    if request.get(key) is fut:
+        request[key] = value  # unless invalidated in the meantime
+    fut.set_result(value)
+    return value
+
+
+async def _identify(request: web.Request, security: SecurityContext) -> Optional[str]:
+    if PUBLIC_KEY in request:
+        return None
+
+    def resolve() -> Awaitable[Optional[str]]:
+        return _timed(request, security, "identify",
+                      security.identity_policy.identify(request))
+
+    return cast(Optional[str], await _memoize(request, security.identity_key, resolve))
+
+
+def _invalidate(request: web.Request) -> None:
+    for key in [k for k in request if k.startswith(_MEMO_PREFIXES)]:
+        del request[key]
+    request.pop(PUBLIC_KEY, None)
 
 
 async def remember(request: web.Request, response: web.StreamResponse,
@@ -24,15 +187,16 @@ async def remember(request: web.Request, response: web.StreamResponse,
     """
     if not identity or not isinstance(identity, str):
         raise ValueError("Identity should be a str value.")
-    identity_policy = request.config_dict.get(IDENTITY_KEY)
-    if identity_policy is None:
+    security = _context(request)
+    if security is None:
         text = ("Security subsystem is not initialized, "
                 "call aiohttp_security.setup(...) first")
         # in order to see meaningful exception message both: on console
         # output and rendered page we add same message to *reason* and
         # *text* arguments.
         raise web.HTTPInternalServerError(reason=text, text=text)
-    await identity_policy.remember(request, response, identity, **kwargs)
+    await security.identity_policy.remember(request, response, identity, **kwargs)
+    _invalidate(request)
 
 
 async def forget(request: web.Request, response: web.StreamResponse) -> None:
@@ -41,27 +205,34 @@ async def forget(request: web.Request, response: web.StreamResponse) -> None:
     Usually it clears cookie or server-side storage to forget user
     session.
     """
-    identity_policy = request.config_dict.get(IDENTITY_KEY)
-    if identity_policy is None:
+    security = _context(request)
+    if security is None:
         text = ("Security subsystem is not initialized, "
                 "call aiohttp_security.setup(...) first")
         # in order to see meaningful exception message both: on console
         # output and rendered page we add same message to *reason* and
         # *text* arguments.
         raise web.HTTPInternalServerError(reason=text, text=text)
-    await identity_policy.forget(request, response)
+    await security.identity_policy.forget(request, response)
+    _invalidate(request)
 
 
 async def authorized_userid(request: web.Request) -> Optional[str]:
-    identity_policy: _AIP = request.config_dict.get(IDENTITY_KEY)
-    autz_policy: _AAP = request.config_dict.get(AUTZ_KEY)
-    if identity_policy is None or autz_policy is None:
+    security = _context(request)
+    if security is None:
         return None
-    identity = await identity_policy.identify(request)
+    if security.cache_decisions is False:
+        return await _authorized_userid(request, security)
+    return cast(Optional[str], await _memoize(
+        request, security.userid_key, lambda: _authorized_userid(request, security)))
+
+
+async def _authorized_userid(request: web.Request, security: SecurityContext) -> Optional[str]:
+    identity = await _identify(request, security)
     if identity is None:
         return None  # non-registered user has None user_id
-    user_id = await autz_policy.authorized_userid(identity)
-    return user_id
+    return await _timed(request, security, "authorized_userid",
+                        security.autz_policy.authorized_userid(identity))
 
 
 def _validate_permission(permission: Union[str, enum.Enum]) -> None:
@@ -72,26 +243,108 @@ def _validate_permission(permission: Union[str, enum.Enum]) -> None:
 async def permits(request: web.Request, permission: Union[str, enum.Enum],
                   context: Any = None) -> bool:
     _validate_permission(permission)
-    identity_policy: _AIP = request.config_dict.get(IDENTITY_KEY)
-    autz_policy: _AAP = request.config_dict.get(AUTZ_KEY)
-    if identity_policy is None or autz_policy is None:
+    return await _permits(request, permission, context)
+
+
+async def _permits(request: web.Request, permission: Union[str, enum.Enum],
+                   context: Any = None) -> bool:
+    # permits() for an already validated permission
+    security = _context(request)
+    if security is None:
         return True
-    identity = await identity_policy.identify(request)
-    # non-registered user still may have some permissions
-    access = await autz_policy.permits(identity, permission, context)
+    identity = await _identify(request, security)
+    autz_policy = security.autz_policy
+    if security.cache_decisions is False:
+        # non-registered user still may have some permissions
+        return await _timed(request, security, "permits",
+                            autz_policy.permits(identity, permission, context), permission)
+
+    cache: Dict[_PermitsKey, bool] = request.setdefault(security.permits_key, {})
+    key = (identity, type(permission), permission, context)
+    try:
+        return cache[key]
+    except KeyError:
+        pass
+    except TypeError:
+        # unhashable context, the decision cannot be memoized
+        return await _timed(request, security, "permits",
+                            autz_policy.permits(identity, permission, context), permission)
+    access = await _timed(request, security, "permits",
+                          autz_policy.permits(identity, permission, context), permission)
+    cache[key] = access
     return access
 
 
+async def permits_many(request: web.Request,
+                       permissions: Iterable[Union[str, enum.Enum]],
+                       context: Any = None) -> Dict[Union[str, enum.Enum], bool]:
+    """Check several permissions at once.
+
+    Return a mapping of every requested permission to its permits()
+    result. Permissions missing from the per-request decision cache are
+    resolved with a single autz_policy.permits_many() call. Equal
+    permissions of different types, e.g. members of two IntFlag classes
+    with the same value, share an entry, True only if all are granted.
+    """
+    perms = _unique(permissions)
+    for permission in perms:
+        _validate_permission(permission)
+    return _combine(zip(perms, await _permits_many(request, perms, context)))
+
+
+async def _permits_many(request: web.Request, perms: List[Union[str, enum.Enum]],
+                        context: Any = None) -> List[bool]:
+    # decisions for unique, already validated permissions, in order
+    security = _context(request)
+    if security is None:
+        return [True] * len(perms)
+    identity = await _identify(request, security)
+    if security.cache_decisions is False:
+        return await _resolve_many(request, security, identity, perms, context)
+
+    cache: Dict[_PermitsKey, bool] = request.setdefault(security.permits_key, {})
+    decisions: List[Optional[bool]] = []
+    try:
+        for permission in perms:
+            decisions.append(cache.get((identity, type(permission), permission, context)))
+    except TypeError:
+        # unhashable context, decisions cannot be memoized
+        return await _resolve_many(request, security, identity, perms, context)
+    missing = [p for p, access in zip(perms, decisions) if access is None]
+    if missing:
+        resolved = iter(await _resolve_many(request, security, identity, missing, context))
+        for index, (permission, access) in enumerate(zip(perms, decisions)):
+            if access is None:
+                access = decisions[index] = next(resolved)
+                cache[(identity, type(permission), permission, context)] = access
+    return cast(List[bool], decisions)
+
+
+async def _resolve_many(request: web.Request, security: SecurityContext,
+                        identity: Optional[str], perms: List[Union[str, enum.Enum]],
+                        context: Any) -> List[bool]:
+    # a single policy call, unless equal permissions of different types
+    # have to be split over several
+    resolved: Dict[Tuple[type, Union[str, enum.Enum]], bool] = {}
+    for batch in _batches(perms):
+        result = await _timed(request, security, "permits_many",
+                              security.autz_policy.permits_many(identity, batch, context),
+                              *batch)
+        for permission in batch:
+            resolved[(type(permission), permission)] = result[permission]
+    return [resolved[(type(p), p)] for p in perms]
+
+
 async def is_anonymous(request: web.Request) -> bool:
     """Check if user is anonymous.
 
     User is considered anonymous if there is not identity
     in request.
     """
-    identity_policy = request.config_dict.get(IDENTITY_KEY)
-    if identity_policy is None:
+    security = _context(request)
+    if security is None:
         return True
-    identity = await identity_policy.identify(request)
+    identity = await _identify(request, security)
     if identity is None:
         return True
     return False
@@ -116,18 +369,86 @@ async def check_permission(request: web.Request, permission: Union[str, enum.Enu
     """
 
     _validate_permission(permission)
+    await _check_permission(request, permission, context)
+
+
+async def _check_permission(request: web.Request, permission: Union[str, enum.Enum],
+                            context: Any = None) -> None:
+    # check_permission() for an already validated permission
     await check_authorized(request)
-    allowed = await permits(request, permission, context)
+    allowed = await _permits(request, permission, context)
     if not allowed:
         raise web.HTTPForbidden(reason="User does not have '{}' permission".format(permission))
 
 
+async def check_permissions(request: web.Request,
+                            permissions: Iterable[Union[str, enum.Enum]],
+                            context: Any = None) -> None:
+    """Checker that passes only to authorized users with all given permissions.
+
+    If user is not authorized - raises HTTPUnauthorized,
+    if user is authorized and lacks any of permissions -
+    raises HTTPForbidden.
+    """
+
+    perms = _unique(permissions)
+    for permission in perms:
+        _validate_permission(permission)
+    await check_authorized(request)
+    decisions = await _permits_many(request, perms, context)
+    denied = [str(permission) for permission, access in zip(perms, decisions) if not access]
+    if denied:
+        raise web.HTTPForbidden(
+            reason="User does not have '{}' permission".format("', '".join(denied)))
+
+
 def setup(app: web.Application, identity_policy: AbstractIdentityPolicy,
-          autz_policy: AbstractAuthorizationPolicy) -> None:
+          autz_policy: AbstractAuthorizationPolicy, *,
+          cache_decisions: Optional[bool] = None,
+          metrics: Optional[AbstractMetricsSink] = None,
+          profiler: Optional[SlowCallProfiler] = None) -> None:
+    """Setup application with security policies.
+
+    authorized_userid() and permits() results are memoized per request
+    by default; pass cache_decisions=False for authorization policies
+    whose decisions depend on mutable context. Left None, it is
+    inherited from the parent application, if any.
+
+    With a *metrics* sink every policy call is timed and reported to it.
+    With a *profiler* policy calls slower than its threshold are sampled
+    and reported to files.
+    """
     if not isinstance(identity_policy, AbstractIdentityPolicy):
         raise ValueError("Identity policy is not subclass of AbstractIdentityPolicy")
     if not isinstance(autz_policy, AbstractAuthorizationPolicy):
         raise ValueError("Authentication policy is not subclass of AbstractAuthorizationPolicy")
 
+    if metrics is not None:
+        identity_policy = InstrumentedIdentityPolicy(identity_policy, metrics)
+        autz_policy = InstrumentedAuthorizationPolicy(autz_policy, metrics)
+
     app[IDENTITY_KEY] = identity_policy
     app[AUTZ_KEY] = autz_policy
+    app[CONTEXT_KEY] = SecurityContext(identity_policy, autz_policy, cache_decisions,
+                                       profiler)
+    app.on_startup.append(_inherit_options)
+
+
+async def _inherit_options(app: web.Application) -> None:
+    _inherit(app, app[CONTEXT_KEY])
+
+
+def _inherit(app: web.Application, parent: SecurityContext) -> None:
+    for resource in app.router.resources():
+        subapp = resource.get_info().get("app")
+        if subapp is None:
+            continue
+        security = subapp.get(CONTEXT_KEY)
+        if security is None:
+            _inherit(subapp, parent)
+        else:
+            if security.cache_decisions is None:
+                security.cache_decisions = parent.cache_decisions
+            if security.profiler is None:
+                security.profiler = parent.profiler
+            _inherit(subapp, security)
@@ -0,0 +1,174 @@
+"""Bounded caches with per-entry expiry.
+
+CachedAuthorizationPolicy wraps another authorization policy and
+memoizes its decisions across requests.
+
+"""
+
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import (Any, Callable, Dict, Generic, Hashable, Iterable, List, NamedTuple,
+                    Optional, Tuple, TypeVar, Union, cast)
+
+from .abc import AbstractAuthorizationPolicy, _batches, _combine, _unique
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class TTLCache(Generic[_K, _V]):
+    """LRU cache holding at most *maxsize* entries, each one expiring
+    *ttl* seconds after it was stored.
+
+    Expired entries are dropped lazily, on access, or when they reach
+    the least recently used end of the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float,
+                 timer: Callable[[], float] = time.monotonic):
+        if maxsize <= 0:
+            raise ValueError("maxsize should be a positive integer.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data: "OrderedDict[_K, Tuple[float, _V]]" = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: _K, default: Optional[_V] = None) -> Optional[_V]:
+        item = self._data.get(key)
+        if item is not None:
+            if item[0] > self.timer():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: _K, value: _V, ttl: Optional[float] = None) -> None:
+        """Store *value*, *ttl* overrides the default time to live."""
+        if ttl is None:
+            ttl = self.ttl
+        if ttl <= 0:
+            self._data.pop(key, None)
+            return
+        now = self.timer()
+        data = self._data
+        data[key] = (now + ttl, value)
+        data.move_to_end(key)
+        while len(data) > self.maxsize:
+            _, (expires, _) = data.popitem(last=False)
+            if expires > now:
+                self.evictions += 1
+
+    def pop(self, key: _K) -> None:
+        self._data.pop(key, None)
+
+    def discard_if(self, predicate: Callable[[_K], bool]) -> None:
+        """Drop every entry whose key matches *predicate*."""
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         self.maxsize, len(self._data))
+
+
+class CachedAuthorizationPolicy(AbstractAuthorizationPolicy):
+    """Authorization policy memoizing decisions of the *inner* policy.
+
+    authorized_userid() and permits() results are kept in a bounded LRU
+    cache for *ttl* seconds, negative results (``None`` user id and
+    denied permissions) for *negative_ttl* seconds. A zero
+    *negative_ttl* disables negative caching. Calls with an unhashable
+    context are always passed through to the inner policy.
+    """
+
+    def __init__(self, inner: AbstractAuthorizationPolicy, maxsize: int = 1024,
+                 ttl: float = 60.0, negative_ttl: Optional[float] = None,
+                 timer: Callable[[], float] = time.monotonic):
+        if not isinstance(inner, AbstractAuthorizationPolicy):
+            raise ValueError("Inner policy is not subclass of AbstractAuthorizationPolicy")
+        self.inner = inner
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._cache: TTLCache[Tuple[Any, ...], Any] = TTLCache(maxsize, ttl, timer)
+
+    async def authorized_userid(self, identity: str) -> Optional[str]:
+        key = ("authorized_userid", identity)
+        item: Optional[Tuple[Optional[str]]] = self._cache.get(key)
+        if item is not None:
+            return item[0]
+        user_id = await self.inner.authorized_userid(identity)
+        self._cache.set(key, (user_id,),
+                        self.ttl if user_id is not None else self.negative_ttl)
+        return user_id
+
+    async def permits(self, identity: Optional[str], permission: Union[str, Enum],
+                      context: Any = None) -> bool:
+        key = ("permits", identity, type(permission), permission, context)
+        try:
+            access: Optional[bool] = self._cache.get(key)
+        except TypeError:
+            # unhashable context, the decision cannot be memoized
+            return await self.inner.permits(identity, permission, context)
+        if access is not None:
+            return access
+        access = await self.inner.permits(identity, permission, context)
+        self._cache.set(key, access, self.ttl if access else self.negative_ttl)
+        return access
+
+    async def permits_many(self, identity: Optional[str],
+                           permissions: Iterable[Union[str, Enum]],
+                           context: Any = None) -> Dict[Union[str, Enum], bool]:
+        perms = _unique(permissions)
+        try:
+            decisions: List[Optional[bool]] = [
+                self._cache.get(("permits", identity, type(p), p, context)) for p in perms]
+        except TypeError:
+            # unhashable context, decisions cannot be memoized
+            return _combine(zip(perms, await self._resolve_many(identity, perms, context)))
+        missing = [p for p, access in zip(perms, decisions) if access is None]
+        if missing:
+            resolved = iter(await self._resolve_many(identity, missing, context))
+            for index, permission in enumerate(perms):
+                if decisions[index] is None:
+                    access = decisions[index] = next(resolved)
+                    self._cache.set(("permits", identity, type(permission), permission,
+                                     context), access, self.ttl if access else self.negative_ttl)
+        return _combine(zip(perms, cast(List[bool], decisions)))
+
+    async def _resolve_many(self, identity: Optional[str], perms: List[Union[str, Enum]],
+                            context: Any) -> List[bool]:
+        # equal permissions of different types go to separate inner calls
+        resolved: Dict[Tuple[type, Union[str, Enum]], bool] = {}
+        for batch in _batches(perms):
+            result = await self.inner.permits_many(identity, batch, context)
+            for permission in batch:
+                resolved[(type(permission), permission)] = result[permission]
+        return [resolved[(type(p), p)] for p in perms]
+
+    def invalidate(self, identity: Optional[str] = None) -> None:
+        """Drop cached decisions of *identity*, or all of them if omitted."""
+        if identity is None:
+            self._cache.clear()
+        else:
+            self._cache.discard_if(lambda key: key[1] == identity)
+
+    def cache_info(self) -> CacheInfo:
+        return self._cache.cache_info()
@@ -0,0 +1,66 @@
+"""Identity policy combining several credential sources.
+
+Sub-policies are given in the order they should be tried, cheapest
+first. Each one is asked with has_credentials() whether the request
+carries its credentials, and only those answering yes run identify(),
+e.g. API clients sending a bearer token never cause a session store
+read.
+
+"""
+
+from typing import Any, Optional
+
+from aiohttp import web
+
+from .abc import AbstractIdentityPolicy
+
+
+class CompositeIdentityPolicy(AbstractIdentityPolicy):
+
+    def __init__(self, *policies: AbstractIdentityPolicy,
+                 default: Optional[AbstractIdentityPolicy] = None):
+        if not policies:
+            raise ValueError("At least one identity policy is required.")
+        for policy in policies:
+            if not isinstance(policy, AbstractIdentityPolicy):
+                raise ValueError("Identity policy is not subclass of AbstractIdentityPolicy")
+        if default is not None and default not in policies:
+            raise ValueError("Default policy should be one of the policies.")
+        self.policies = policies
+        self.default = policies[0] if default is None else default
+        # the sub-policy which identified a request is kept on it
+        self._source_key = "aiohttp_security_composite_{}".format(id(self))
+
+    def has_credentials(self, request: web.Request) -> bool:
+        return any(policy.has_credentials(request) for policy in self.policies)
+
+    async def identify(self, request: web.Request) -> Optional[str]:
+        for policy in self.policies:
+            if not policy.has_credentials(request):
+                continue
+            identity = await policy.identify(request)
+            if identity is not None:
+                request[self._source_key] = policy
+                return identity
+        request[self._source_key] = None
+        return None
+
+    async def remember(self, request: web.Request, response: web.StreamResponse,
+                       identity: str, **kwargs: Any) -> None:
+        """Remember identity with the sub-policy which identified the
+        request, with the default one if none did or the request was not
+        identified (e.g. on login)."""
+        policy = request.get(self._source_key)
+        await (policy or self.default).remember(request, response, identity, **kwargs)
+
+    async def forget(self, request: web.Request, response: web.StreamResponse) -> None:
+        """Forget identity with the sub-policy which identified the
+        request, with every sub-policy having credentials if none did or
+        the request was not identified."""
+        policy: Optional[AbstractIdentityPolicy] = request.get(self._source_key)
+        if policy is not None:
+            await policy.forget(request, response)
+            return
+        for policy in self.policies:
+            if policy.has_credentials(request):
+                await policy.forget(request, response)
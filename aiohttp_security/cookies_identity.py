@@ -24,6 +24,9 @@ class CookiesIdentityPolicy(AbstractIdentityPolicy):
     async def identify(self, request: web.Request) -> Optional[str]:
         return request.cookies.get(self._cookie_name)
 
+    def has_credentials(self, request: web.Request) -> bool:
+        return self._cookie_name in request.cookies
+
     async def remember(self, request: web.Request, response: web.StreamResponse,
                        identity: str, max_age: Union[_Sentinel, Optional[int]] = sentinel,
                        **kwargs: Any) -> None:
@@ -0,0 +1,77 @@
+"""Permissions as enum.IntFlag members.
+
+Each user's grants are a single int, a permission check is a bitwise
+AND. A combined flag, e.g. ``Permission.READ | Permission.WRITE``,
+passed to permits() or check_permission() is an all-of check answered
+by the same single operation.
+
+Grants are plain ints, so they can be stored as they are in sessions,
+token claims or database columns; load_flags() turns them back into
+flags, rejecting bits unknown to the flag type.
+
+"""
+
+import functools
+import operator
+from enum import Enum, IntFlag
+from typing import Any, Dict, Iterable, Mapping, Optional, Type, TypeVar, Union
+
+from .abc import AbstractAuthorizationPolicy
+
+_F = TypeVar("_F", bound=IntFlag)
+
+
+def load_flags(flag_type: Type[_F], value: int) -> _F:
+    """Return the *flag_type* flags serialized as the int *value*."""
+    known = functools.reduce(operator.or_, (member.value for member in flag_type), 0)
+    if value & ~known:
+        raise ValueError("Unknown {} bits: {:#x}".format(flag_type.__name__, value & ~known))
+    return flag_type(value)
+
+
+class FlagAuthorizationPolicy(AbstractAuthorizationPolicy):
+    """Authorization policy for *flag_type* permissions.
+
+    *grants* maps user ids to their permissions, as *flag_type* flags
+    or their int serialization. Permissions given as strings are looked
+    up by member name.
+    """
+
+    def __init__(self, flag_type: Type[IntFlag], grants: Mapping[str, Union[int, IntFlag]]):
+        self.flag_type = flag_type
+        self._grants: Dict[Optional[str], int] = {}
+        for user, flags in grants.items():
+            if isinstance(flags, IntFlag) and not isinstance(flags, flag_type):
+                raise ValueError("Grants of {} are not {} flags".format(
+                    user, flag_type.__name__))
+            self._grants[user] = load_flags(flag_type, flags).value
+        self._names = {name: member.value for name, member in flag_type.__members__.items()}
+
+    async def authorized_userid(self, identity: str) -> Optional[str]:
+        return identity if identity in self._grants else None
+
+    async def permits(self, identity: Optional[str], permission: Union[str, Enum],
+                      context: Any = None) -> bool:
+        value = self._value(permission)
+        return value != 0 and self._grants.get(identity, 0) & value == value
+
+    async def permits_many(self, identity: Optional[str],
+                           permissions: Iterable[Union[str, Enum]],
+                           context: Any = None) -> Dict[Union[str, Enum], bool]:
+        granted = self._grants.get(identity, 0)
+        result = {}
+        for permission in permissions:
+            value = self._value(permission)
+            result[permission] = value != 0 and granted & value == value
+        return result
+
+    def grants(self, identity: str) -> IntFlag:
+        """Return the permissions granted to *identity*."""
+        return self.flag_type(self._grants.get(identity, 0))
+
+    def _value(self, permission: Union[str, Enum]) -> int:
+        if isinstance(permission, self.flag_type):
+            return permission.value
+        if isinstance(permission, str):
+            return self._names.get(permission, 0)
+        return 0
@@ -2,25 +2,58 @@
 
 """
 
-from typing import Optional, Tuple, Type
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from concurrent.futures import Executor
+from typing import AbstractSet, Any, Dict, Mapping, Optional, Tuple, Type, Union
 
 from aiohttp import web
 
 from .abc import AbstractIdentityPolicy
+from .cache import CacheInfo, TTLCache
 
 try:
     import jwt
     HAS_JWT = True
     _bases_error: Tuple[Type[jwt.exceptions.PyJWTError], ...]
     _bases_error = (jwt.exceptions.PyJWTError,)
+    # "sub" and "jti" claims are validated since PyJWT 2.10
+    _VALIDATE_SUB_JTI = hasattr(jwt.exceptions, "InvalidJTIError")
 except ImportError:  # pragma: no cover
     HAS_JWT = False
     _bases_error = ()
 
 
+logger = logging.getLogger(__name__)
+
 AUTH_HEADER_NAME = 'Authorization'
 AUTH_SCHEME = 'Bearer '
 
+# Public key algorithms, verifying those is expensive enough to be worth
+# moving off the event loop.
+ASYMMETRIC_ALGORITHMS = frozenset((
+    "RS256", "RS384", "RS512",
+    "PS256", "PS384", "PS512",
+    "ES256", "ES256K", "ES384", "ES512",
+    "EdDSA",
+))
+
+_HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+# Header parameters the fast HMAC verifier understands, tokens with any
+# other (e.g. "b64" or "crit") are left to jwt.decode().
+_FAST_HEADERS = frozenset(("alg", "typ", "kid"))
+
 
 # This class inherits from ValueError to maintain backward compatibility
 # with previous versions of aiohttp-security
@@ -29,12 +62,107 @@ class InvalidAuthorizationScheme(ValueError, *_bases_error):  # type: ignore[mis
 
 
 class JWTIdentityPolicy(AbstractIdentityPolicy):
-    def __init__(self, secret: str, algorithm: str = "HS256", key: str = "login"):
+    """Identity policy reading the identity from a bearer token.
+
+    Tokens are verified with *secret*, or with the key of *keys* (a
+    mapping of key ids to keys) or of the *jwks_file* JSON Web Key Set
+    selected by the token ``kid`` header. Keys are parsed once, the
+    *jwks_file* is checked for changes every *reload_interval* seconds
+    and replaced as a whole, so keys can be rotated without a restart.
+    The file is watched by a background task started on the first
+    request and stopped by close(), which close_on_cleanup() calls when
+    the application is cleaned up; it is read and parsed in *executor*,
+    or the default one, so requests only look up keys.
+
+    With a positive *cache_size* identities extracted from verified
+    tokens are kept in a LRU cache until the token ``exp`` claim, or for
+    *cache_ttl* seconds if the token does not expire, so the signature
+    of a token is verified once rather than on every request.
+
+    With a positive *negative_cache_size* recently rejected tokens are
+    remembered for *negative_cache_ttl* seconds, and presenting one again
+    raises the same error without verifying it. Keep the TTL short, so a
+    token presented before its ``nbf`` claim is accepted later on.
+
+    If *executor* is given, tokens signed with one of
+    *offload_algorithms* are verified in that executor instead of
+    blocking the event loop.
+
+    Before any signature verification tokens longer than
+    *max_token_length*, malformed, signed with another algorithm or
+    already expired are rejected with the error jwt.decode() would raise.
+
+    With *fast_hmac* HS256/HS384/HS512 tokens are verified by a
+    pre-keyed :mod:`hmac` instead of jwt.decode(), validating claims the
+    same way jwt.decode() does with its default options and *leeway*.
+    """
+
+    def __init__(self, secret: Optional[str] = None, algorithm: str = "HS256",
+                 key: str = "login", cache_size: int = 0, cache_ttl: float = 300.0,
+                 executor: Optional[Executor] = None,
+                 offload_algorithms: AbstractSet[str] = ASYMMETRIC_ALGORITHMS,
+                 keys: Optional[Mapping[str, Any]] = None,
+                 jwks_file: Optional[Union[str, "os.PathLike[str]"]] = None,
+                 reload_interval: float = 1.0, max_token_length: int = 8192,
+                 leeway: float = 0, fast_hmac: bool = False,
+                 negative_cache_size: int = 0, negative_cache_ttl: float = 5.0):
         if not HAS_JWT:
             raise RuntimeError('Please install `PyJWT`')
+        if secret is None and keys is None and jwks_file is None:
+            raise ValueError("One of secret, keys or jwks_file is required.")
+        if keys is not None and jwks_file is not None:
+            raise ValueError("keys and jwks_file are mutually exclusive.")
+        if fast_hmac and algorithm not in _HMAC_DIGESTS:
+            raise ValueError("fast_hmac requires one of {} algorithms.".format(
+                ", ".join(_HMAC_DIGESTS)))
         self.secret = secret
         self.algorithm = algorithm
         self.key = key
+        self.max_token_length = max_token_length
+        self.leeway = leeway
+        self.fast_hmac = fast_hmac
+        # pre-keyed HMAC objects, indexed by prepared key
+        self._macs: Dict[bytes, Any] = {}
+        self.executor = executor
+        self._offload = executor is not None and algorithm in offload_algorithms
+        self._cache: Optional[TTLCache[bytes, Tuple[Optional[str]]]] = None
+        if cache_size > 0:
+            self._cache = TTLCache(cache_size, cache_ttl)
+        self._rejected: Optional[TTLCache[bytes, Tuple[Type[Exception], Tuple[Any, ...]]]]
+        self._rejected = None
+        if negative_cache_size > 0:
+            self._rejected = TTLCache(negative_cache_size, negative_cache_ttl)
+
+        self._algorithm = jwt.get_algorithm_by_name(algorithm)
+        self._key: Any = None
+        if secret is not None:
+            self._key = self._algorithm.prepare_key(secret)
+        self._keys: Optional[Dict[str, Any]] = None
+        if keys is not None:
+            self._keys = {kid: self._algorithm.prepare_key(k) for kid, k in keys.items()}
+        self.jwks_file = jwks_file
+        self.reload_interval = reload_interval
+        self._jwks_stat: Optional[Tuple[int, int]] = None
+        self._watcher: Optional["asyncio.Task[None]"] = None
+        if jwks_file is not None:
+            loaded = self._load_jwks()
+            if loaded is not None:
+                self._set_jwks(*loaded)
+
+    def cache_info(self) -> Optional[CacheInfo]:
+        """Return decoded tokens cache statistics, None if it is disabled."""
+        if self._cache is None:
+            return None
+        return self._cache.cache_info()
+
+    def negative_cache_info(self) -> Optional[CacheInfo]:
+        """Return rejected tokens cache statistics, None if it is disabled."""
+        if self._rejected is None:
+            return None
+        return self._rejected.cache_info()
+
+    def has_credentials(self, request: web.Request) -> bool:
+        return request.headers.get(AUTH_HEADER_NAME, "").startswith(AUTH_SCHEME)
 
     async def identify(self, request: web.Request) -> Optional[str]:
         header_identity = request.headers.get(AUTH_HEADER_NAME)
@@ -46,12 +174,219 @@ class JWTIdentityPolicy(AbstractIdentityPolicy):
             raise InvalidAuthorizationScheme("Invalid authorization scheme. "
                                              "Should be `{}<token>`".format(AUTH_SCHEME))
 
-        token = header_identity.split(' ')[1].strip()
+        token = header_identity[len(AUTH_SCHEME):].strip()
+        if len(token) > self.max_token_length:
+            raise jwt.DecodeError("Token is too long")
+
+        if self.jwks_file is not None:
+            self._watch_jwks()
+
+        if self._cache is None and self._rejected is None:
+            payload = await self._decode(token)
+            return payload.get(self.key)
+
+        digest = hashlib.sha256(token.encode()).digest()
+        if self._cache is not None:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                return cached[0]
+        if self._rejected is not None:
+            rejected = self._rejected.get(digest)
+            if rejected is not None:
+                exc_type, args = rejected
+                raise exc_type(*args)
+
+        try:
+            payload = await self._decode(token)
+        except jwt.PyJWTError as exc:
+            if self._rejected is not None:
+                self._rejected.set(digest, (type(exc), exc.args))
+            raise
+        identity = payload.get(self.key)
+        if self._cache is not None:
+            # evict the identity once the token expires
+            ttl = int(payload["exp"]) - time.time() if "exp" in payload else None
+            self._cache.set(digest, (identity,), ttl)
+        return identity
 
-        identity = jwt.decode(token,
-                              self.secret,
-                              algorithms=[self.algorithm])
-        return identity.get(self.key)  # type: ignore[no-any-return]
+    async def _decode(self, token: str) -> Dict[str, Any]:
+        header, payload = self._precheck(token)
+        if self.fast_hmac and _FAST_HEADERS.issuperset(header):
+            return self._decode_hmac(token, header, payload)
+        if self._offload:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._decode_sync,
+                                              token, header)
+        return self._decode_sync(token, header)
+
+    def _decode_sync(self, token: str, header: Dict[str, Any]) -> Dict[str, Any]:
+        return jwt.decode(token, self._select_key(header),  # type: ignore[no-any-return]
+                          algorithms=[self.algorithm], leeway=self.leeway)
+
+    def _decode_hmac(self, token: str, header: Dict[str, Any],
+                     payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Verify HMAC signed token, mirroring jwt.decode() checks."""
+        key = self._select_key(header)
+        mac = self._macs.get(key)
+        if mac is None:
+            mac = self._macs[key] = hmac.new(key, digestmod=_HMAC_DIGESTS[self.algorithm])
+        signing_input, _, crypto_segment = token.encode().rpartition(b".")
+        try:
+            signature = base64.urlsafe_b64decode(
+                crypto_segment + b"=" * (-len(crypto_segment) % 4))
+        except ValueError:
+            raise jwt.DecodeError("Invalid crypto padding") from None
+        mac = mac.copy()
+        mac.update(signing_input)
+        if not hmac.compare_digest(mac.digest(), signature):
+            raise jwt.InvalidSignatureError("Signature verification failed")
+
+        now = time.time()
+        if "iat" in payload:
+            try:
+                iat = int(payload["iat"])
+            except ValueError:
+                raise jwt.InvalidIssuedAtError(
+                    "Issued At claim (iat) must be an integer.") from None
+            if iat > now + self.leeway:
+                raise jwt.ImmatureSignatureError("The token is not yet valid (iat)")
+        if "nbf" in payload:
+            try:
+                nbf = int(payload["nbf"])
+            except ValueError:
+                raise jwt.DecodeError("Not Before claim (nbf) must be an integer.") from None
+            if nbf > now + self.leeway:
+                raise jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+        if "exp" in payload:
+            try:
+                exp = int(payload["exp"])
+            except ValueError:
+                raise jwt.DecodeError(
+                    "Expiration Time claim (exp) must be an integer.") from None
+            if exp <= now - self.leeway:
+                raise jwt.ExpiredSignatureError("Signature has expired")
+        if payload.get("aud"):
+            # no audience is configured, any token restricted to one is rejected
+            raise jwt.InvalidAudienceError("Invalid audience")
+        if _VALIDATE_SUB_JTI:
+            if "sub" in payload and not isinstance(payload["sub"], str):
+                raise jwt.exceptions.InvalidSubjectError("Subject must be a string")
+            if "jti" in payload and not isinstance(payload["jti"], str):
+                raise jwt.exceptions.InvalidJTIError("JWT ID must be a string")
+        return payload
+
+    def _precheck(self, token: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Cheaply reject tokens that cannot pass verification.
+
+        Return the unverified token header and payload.
+        """
+        if token.count(".") != 2:
+            raise jwt.DecodeError("Not enough segments")
+        header_segment, payload_segment, _ = token.split(".")
+        header = _load_segment(header_segment, "header")
+        if header.get("alg") != self.algorithm:
+            raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
+        payload = _load_segment(payload_segment, "payload")
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)) and not isinstance(exp, bool):
+            if exp <= time.time() - self.leeway:
+                raise jwt.ExpiredSignatureError("Signature has expired")
+        return header, payload
+
+    def _select_key(self, header: Dict[str, Any]) -> Any:
+        keys = self._keys
+        if keys is None:
+            return self._key
+        kid = header.get("kid")
+        if kid is None:
+            if self._key is None:
+                raise jwt.InvalidKeyError("Token has no key id")
+            return self._key
+        try:
+            return keys[kid]
+        except (KeyError, TypeError):
+            raise jwt.InvalidKeyError("Unknown key id {!r}".format(kid)) from None
+
+    async def reload_jwks(self) -> None:
+        """Reload the *jwks_file* now if it changed."""
+        loop = asyncio.get_running_loop()
+        loaded = await loop.run_in_executor(self.executor, self._load_jwks)
+        if loaded is not None:
+            self._set_jwks(*loaded)
+
+    async def close(self) -> None:
+        """Stop watching the *jwks_file*."""
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.cancel()
+            try:
+                await watcher
+            except asyncio.CancelledError:
+                pass
+
+    def close_on_cleanup(self, app: web.Application) -> None:
+        """Stop watching the *jwks_file* when *app* is cleaned up."""
+        async def close(app: web.Application) -> None:
+            await self.close()
+
+        app.on_cleanup.append(close)
+
+    def _watch_jwks(self) -> None:
+        # started on the first request, in the loop serving requests
+        watcher = self._watcher
+        if watcher is None or watcher.done() or (
+                watcher.get_loop() is not asyncio.get_running_loop()):
+            self._watcher = asyncio.ensure_future(self._watch_jwks_forever())
+
+    async def _watch_jwks_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload_jwks()
+            except Exception:
+                logger.exception("Cannot reload JWKS file %s", self.jwks_file)
+
+    def _load_jwks(self) -> Optional[Tuple[Tuple[int, int], Dict[str, Any]]]:
+        """Return the stat and keys of the *jwks_file*, None if it did
+        not change or cannot be loaded while keys are already known."""
+        jwks_file = self.jwks_file
+        if jwks_file is None:
+            return None
+        try:
+            st = os.stat(jwks_file)
+        except OSError:
+            if self._keys is None:
+                raise
+            logger.warning("Cannot stat JWKS file %s, keeping current keys",
+                           jwks_file, exc_info=True)
+            return None
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self._jwks_stat:
+            return None
+
+        try:
+            with open(jwks_file, encoding="utf-8") as f:
+                jwks = jwt.PyJWKSet.from_json(f.read())
+        except (OSError, ValueError, jwt.PyJWKSetError):
+            if self._keys is None:
+                raise
+            logger.warning("Cannot load JWKS file %s, keeping current keys",
+                           jwks_file, exc_info=True)
+            return None
+        return stat, {k.key_id: k.key for k in jwks.keys if k.key_id is not None}
+
+    def _set_jwks(self, stat: Tuple[int, int], keys: Dict[str, Any]) -> None:
+        # the whole key set is swapped at once, concurrent decoding sees
+        # either the old or the new one
+        self._keys = keys
+        self._macs = {}
+        self._jwks_stat = stat
+        if self._cache is not None:
+            # identities decoded with rotated out keys must be verified again
+            self._cache.clear()
+        if self._rejected is not None:
+            # as well as tokens signed with newly added keys
+            self._rejected.clear()
 
     async def remember(self, request: web.Request, response: web.StreamResponse,
                        identity: str, **kwargs: None) -> None:
@@ -59,3 +394,13 @@ class JWTIdentityPolicy(AbstractIdentityPolicy):
 
     async def forget(self, request: web.Request, response: web.StreamResponse) -> None:
         pass
+
+
+def _load_segment(segment: str, name: str) -> Dict[str, Any]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+    except ValueError:
+        raise jwt.DecodeError("Invalid {} string".format(name)) from None
+    if not isinstance(data, dict):
+        raise jwt.DecodeError("Invalid {} string: must be a json object".format(name))
+    return data
@@ -0,0 +1,199 @@
+"""Call counts, errors and latency histograms of security policies.
+
+Pass a metrics sink to setup() and every identity and authorization
+policy call is timed and reported to it, labelled by policy class and
+method name. Without a sink policies are not wrapped at all, so
+disabled metrics cost nothing.
+
+InMemoryMetrics aggregates the observations in-process and
+render_prometheus() formats them in the Prometheus text format.
+
+"""
+
+import abc
+import bisect
+import time
+from enum import Enum
+from typing import Any, Awaitable, Dict, Iterable, Optional, Sequence, Tuple, TypeVar, Union
+
+from aiohttp import web
+from aiohttp.typedefs import Handler
+
+from .abc import AbstractAuthorizationPolicy, AbstractIdentityPolicy
+
+_T = TypeVar("_T")
+
+# Upper bounds in seconds, an implicit +Inf bucket follows the last one.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class AbstractMetricsSink(metaclass=abc.ABCMeta):
+
+    @abc.abstractmethod
+    def observe(self, policy: str, method: str, duration: float, error: bool) -> None:
+        """Record a single policy call.
+
+        *policy* is the policy class name, *method* the called method,
+        *duration* the call time in seconds and *error* tells whether
+        the call raised.
+        """
+        pass
+
+
+class MethodStats:
+    """Aggregated calls of one policy method."""
+
+    __slots__ = ("count", "errors", "total", "buckets")
+
+    def __init__(self, size: int):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        # non cumulative, buckets[-1] counts calls above the last bound
+        self.buckets = [0] * size
+
+
+class InMemoryMetrics(AbstractMetricsSink):
+    """Metrics sink aggregating observations in-process."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._stats: Dict[Tuple[str, str], MethodStats] = {}
+
+    def observe(self, policy: str, method: str, duration: float, error: bool) -> None:
+        stats = self._stats.get((policy, method))
+        if stats is None:
+            stats = self._stats[policy, method] = MethodStats(len(self.buckets) + 1)
+        stats.count += 1
+        stats.errors += error
+        stats.total += duration
+        stats.buckets[bisect.bisect_left(self.buckets, duration)] += 1
+
+    def stats(self) -> Dict[Tuple[str, str], MethodStats]:
+        """Return stats keyed by *(policy, method)*."""
+        return dict(self._stats)
+
+    def reset(self) -> None:
+        self._stats.clear()
+
+
+def render_prometheus(metrics: InMemoryMetrics, prefix: str = "aiohttp_security") -> str:
+    """Format *metrics* in the Prometheus text exposition format."""
+    calls = "{}_calls_total".format(prefix)
+    errors = "{}_errors_total".format(prefix)
+    duration = "{}_call_duration_seconds".format(prefix)
+    lines = [
+        "# HELP {} Security policy calls.".format(calls),
+        "# TYPE {} counter".format(calls),
+    ]
+    stats = sorted(metrics.stats().items())
+    for (policy, method), item in stats:
+        lines.append('{}{{policy="{}",method="{}"}} {}'.format(
+            calls, _escape(policy), method, item.count))
+    lines += [
+        "# HELP {} Security policy calls that raised.".format(errors),
+        "# TYPE {} counter".format(errors),
+    ]
+    for (policy, method), item in stats:
+        lines.append('{}{{policy="{}",method="{}"}} {}'.format(
+            errors, _escape(policy), method, item.errors))
+    lines += [
+        "# HELP {} Security policy call latency.".format(duration),
+        "# TYPE {} histogram".format(duration),
+    ]
+    for (policy, method), item in stats:
+        labels = 'policy="{}",method="{}"'.format(_escape(policy), method)
+        cumulative = 0
+        for bound, count in zip([*map(repr, metrics.buckets), "+Inf"], item.buckets):
+            cumulative += count
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                duration, labels, bound, cumulative))
+        lines.append("{}_sum{{{}}} {!r}".format(duration, labels, item.total))
+        lines.append("{}_count{{{}}} {}".format(duration, labels, item.count))
+    return "\n".join(lines) + "\n"
+
+
+def metrics_handler(metrics: InMemoryMetrics, prefix: str = "aiohttp_security") -> Handler:
+    """Return a request handler serving *metrics* for Prometheus to scrape."""
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(
+            text=render_prometheus(metrics, prefix),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+    return handler
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+async def _observe(sink: AbstractMetricsSink, policy: str, method: str,
+                   call: Awaitable[_T]) -> _T:
+    started = time.perf_counter()
+    error = True
+    try:
+        result = await call
+        error = False
+        return result
+    finally:
+        sink.observe(policy, method, time.perf_counter() - started, error)
+
+
+class InstrumentedIdentityPolicy(AbstractIdentityPolicy):
+    """Identity policy reporting calls of the *inner* policy to *sink*.
+
+    Other attributes are looked up on the *inner* policy.
+    """
+
+    def __init__(self, inner: AbstractIdentityPolicy, sink: AbstractMetricsSink):
+        self.inner = inner
+        self.sink = sink
+        self.label = type(inner).__name__
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    async def identify(self, request: web.Request) -> Optional[str]:
+        return await _observe(self.sink, self.label, "identify",
+                              self.inner.identify(request))
+
+    async def remember(self, request: web.Request, response: web.StreamResponse,
+                       identity: str, **kwargs: Any) -> None:
+        await _observe(self.sink, self.label, "remember",
+                       self.inner.remember(request, response, identity, **kwargs))
+
+    async def forget(self, request: web.Request, response: web.StreamResponse) -> None:
+        await _observe(self.sink, self.label, "forget", self.inner.forget(request, response))
+
+    def has_credentials(self, request: web.Request) -> bool:
+        return self.inner.has_credentials(request)
+
+
+class InstrumentedAuthorizationPolicy(AbstractAuthorizationPolicy):
+    """Authorization policy reporting calls of the *inner* policy to *sink*.
+
+    Other attributes are looked up on the *inner* policy.
+    """
+
+    def __init__(self, inner: AbstractAuthorizationPolicy, sink: AbstractMetricsSink):
+        self.inner = inner
+        self.sink = sink
+        self.label = type(inner).__name__
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    async def authorized_userid(self, identity: str) -> Optional[str]:
+        return await _observe(self.sink, self.label, "authorized_userid",
+                              self.inner.authorized_userid(identity))
+
+    async def permits(self, identity: Optional[str], permission: Union[str, Enum],
+                      context: Any = None) -> bool:
+        return await _observe(self.sink, self.label, "permits",
+                              self.inner.permits(identity, permission, context))
+
+    async def permits_many(self, identity: Optional[str],
+                           permissions: Iterable[Union[str, Enum]],
+                           context: Any = None) -> Dict[Union[str, Enum], bool]:
+        return await _observe(self.sink, self.label, "permits_many",
+                              self.inner.permits_many(identity, permissions, context))
@@ -0,0 +1,193 @@
+"""Security middleware enforcing permissions declared per route.
+
+Permissions are declared with the ``@requires(...)`` handler decorator
+or by route name in setup_middleware(), and compiled at application
+startup into a table indexed by route, so checking a request costs a
+single dict lookup before the policy calls.
+
+Requests to public path prefixes are treated as anonymous without
+consulting the identity policy at all.
+
+setup_server_timing() reports the time spent in security policies in
+a Server-Timing response header.
+
+"""
+
+import enum
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional,
+                    Tuple, TypeVar, Union)
+
+from aiohttp import web
+from aiohttp.typedefs import Handler
+from aiohttp.web_urldispatcher import AbstractRoute
+
+from .api import (CONTEXT_KEY, PUBLIC_KEY, TIMINGS_KEY, Timing, _check_permission,
+                  _validate_permission)
+
+_T = TypeVar("_T")
+_Permission = Union[str, enum.Enum]
+_Table = Dict[AbstractRoute, Tuple[_Permission, Any]]
+
+PERMISSION_ATTR = "__aiohttp_security_permission__"
+
+
+def requires(permission: _Permission, context: Any = None) -> Callable[[_T], _T]:
+    """Declare the permission a handler requires.
+
+    Works for both function handlers and class based views. The
+    permission is enforced by the middleware installed with
+    setup_middleware().
+    """
+    def wrapper(handler: _T) -> _T:
+        setattr(handler, PERMISSION_ATTR, (permission, context))
+        return handler
+    return wrapper
+
+
+class PathPrefixTrie:
+    """Set of path prefixes matched segment by segment.
+
+    ``/static`` matches ``/static`` and ``/static/css/main.css`` but not
+    ``/statics``.
+    """
+
+    __slots__ = ("children", "terminal")
+
+    def __init__(self, prefixes: Iterable[str] = ()) -> None:
+        self.children: Dict[str, PathPrefixTrie] = {}
+        self.terminal = False
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix: str) -> None:
+        node = self
+        stripped = prefix.strip("/")
+        if stripped:
+            for segment in stripped.split("/"):
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.children[segment] = PathPrefixTrie()
+                node = child
+        node.terminal = True
+
+    def match(self, path: str) -> bool:
+        node = self
+        if node.terminal:
+            return True
+        for segment in path.strip("/").split("/"):
+            child = node.children.get(segment)
+            if child is None:
+                return False
+            if child.terminal:
+                return True
+            node = child
+        return False
+
+
+def setup_middleware(app: web.Application,
+                     permissions: Optional[Mapping[str, _Permission]] = None,
+                     public_paths: Iterable[str] = ()) -> None:
+    """Install security middleware into application.
+
+    *permissions* maps route names to the permission their handlers
+    require, in addition to handlers decorated with ``@requires(...)``.
+    Both are checked at application startup, a non registered route name
+    or an invalid permission raises ValueError there.
+
+    Requests under one of *public_paths* prefixes are anonymous: the
+    identity policy is never called for them. Everywhere else identity
+    is resolved lazily, on the first security api call needing it.
+    """
+    table: _Table = {}
+    public = PathPrefixTrie(public_paths)
+    has_public = bool(public.children) or public.terminal
+
+    async def compile_permissions(app: web.Application) -> None:
+        table.update(_compile(app, permissions or {}))
+
+    @web.middleware
+    async def security_middleware(request: web.Request,
+                                  handler: Handler) -> web.StreamResponse:
+        if has_public and public.match(request.path):
+            request[PUBLIC_KEY] = True
+        required = table.get(request.match_info.route)
+        if required is not None:
+            await _check_permission(request, *required)
+        return await handler(request)
+
+    app.on_startup.append(compile_permissions)
+    app.middlewares.append(security_middleware)
+
+
+def _routes(app: web.Application) -> Iterator[AbstractRoute]:
+    for resource in app.router.resources():
+        subapp = resource.get_info().get("app")
+        if subapp is not None:
+            yield from _routes(subapp)
+        else:
+            yield from resource
+
+
+def _compile(app: web.Application, permissions: Mapping[str, _Permission]) -> _Table:
+    table: _Table = {}
+    for route in _routes(app):
+        required = getattr(route.handler, PERMISSION_ATTR, None)
+        if required is not None:
+            table[route] = required
+
+    for name, permission in permissions.items():
+        try:
+            resource = app.router[name]
+        except KeyError:
+            raise ValueError("Route {!r} is not registered.".format(name)) from None
+        for route in resource:
+            table[route] = (permission, None)
+
+    for route, (permission, _) in table.items():
+        try:
+            _validate_permission(permission)
+        except ValueError as exc:
+            raise ValueError("{} for {!r}".format(exc, route)) from None
+    if table and app.get(CONTEXT_KEY) is None:
+        raise RuntimeError("Security subsystem is not initialized, "
+                           "call aiohttp_security.setup(...) first")
+    return table
+
+
+def setup_server_timing(app: web.Application) -> None:
+    """Report time spent in security policies in a Server-Timing header.
+
+    Every identify(), authorized_userid() and permits() call made while
+    handling a request is timed and collected as a list of Timing tuples
+    in ``request[TIMINGS_KEY]``, e.g. for access logs. The middleware is
+    installed before other middlewares, so their checks are included.
+    """
+    app.middlewares.insert(0, server_timing_middleware)
+
+
+@web.middleware
+async def server_timing_middleware(request: web.Request,
+                                   handler: Handler) -> web.StreamResponse:
+    timings: List[Timing] = []
+    request[TIMINGS_KEY] = timings
+    try:
+        response = await handler(request)
+    except web.HTTPException as exc:
+        # denied requests are the ones worth looking at
+        if timings:
+            exc.headers.add("Server-Timing", _server_timing(timings))
+        raise
+    if timings and not response.prepared:
+        response.headers.add("Server-Timing", _server_timing(timings))
+    return response
+
+
+def _server_timing(timings: List[Timing]) -> str:
+    metrics = []
+    for timing in timings:
+        metric = "{};dur={:.3f}".format(timing.name, timing.duration * 1000)
+        if timing.description:
+            metric += ';desc="{}"'.format(
+                timing.description.replace("\\", "\\\\").replace('"', '\\"'))
+        metrics.append(metric)
+    return ", ".join(metrics)
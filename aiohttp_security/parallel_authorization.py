@@ -0,0 +1,138 @@
+"""Authorization policy querying several sub-policies concurrently.
+
+All sub-policies are called at once and the calls still running are
+cancelled as soon as the combined outcome is known, e.g. on the first
+granted permission in any-of mode, so the slowest source is only
+waited for when its answer matters.
+
+"""
+
+import asyncio
+import logging
+from enum import Enum
+from typing import (Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence,
+                    Tuple, TypeVar, Union)
+
+from .abc import AbstractAuthorizationPolicy, _batches, _combine, _unique
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+MODES = ("any", "all")
+
+
+class ParallelAuthorizationPolicy(AbstractAuthorizationPolicy):
+    """Authorization policy combining *policies* evaluated concurrently.
+
+    In ``"any"`` *mode* a permission is granted if one of the
+    sub-policies grants it, in ``"all"`` mode if every one does.
+
+    *timeouts* optionally gives a time limit in seconds (or None) for
+    each sub-policy, a sub-policy not answering in time denies.
+    """
+
+    def __init__(self, *policies: AbstractAuthorizationPolicy, mode: str = "any",
+                 timeouts: Optional[Sequence[Optional[float]]] = None):
+        if not policies:
+            raise ValueError("At least one authorization policy is required.")
+        for policy in policies:
+            if not isinstance(policy, AbstractAuthorizationPolicy):
+                raise ValueError(
+                    "Authorization policy is not subclass of AbstractAuthorizationPolicy")
+        if mode not in MODES:
+            raise ValueError("Mode should be one of {}.".format(", ".join(MODES)))
+        if timeouts is not None and len(timeouts) != len(policies):
+            raise ValueError("A timeout should be given for every policy.")
+        self.policies = policies
+        self.mode = mode
+        self.timeouts = tuple(timeouts) if timeouts is not None else (None,) * len(policies)
+
+    async def authorized_userid(self, identity: str) -> Optional[str]:
+        """Return the user id known to any (or to all) sub-policies.
+
+        The user id of the first sub-policy to answer is returned, the
+        sub-policies are expected to agree on user ids.
+        """
+        calls = [p.authorized_userid(identity) for p in self.policies]
+        if self.mode == "any":
+            decided, results = await self._race(calls, None, lambda r: r is not None)
+            return results[-1] if decided else None
+        decided, results = await self._race(calls, None, lambda r: r is None)
+        return None if decided else results[0]
+
+    async def permits(self, identity: Optional[str], permission: Union[str, Enum],
+                      context: Any = None) -> bool:
+        calls = [p.permits(identity, permission, context) for p in self.policies]
+        if self.mode == "any":
+            decided, _ = await self._race(calls, False, lambda access: access)
+            return decided
+        decided, _ = await self._race(calls, False, lambda access: not access)
+        return not decided
+
+    async def permits_many(self, identity: Optional[str],
+                           permissions: Iterable[Union[str, Enum]],
+                           context: Any = None) -> Dict[Union[str, Enum], bool]:
+        decisions: List[Tuple[Union[str, Enum], bool]] = []
+        for batch in _batches(_unique(permissions)):
+            decisions.extend(zip(batch, await self._permits_batch(identity, batch, context)))
+        return _combine(decisions)
+
+    async def _permits_batch(self, identity: Optional[str], perms: List[Union[str, Enum]],
+                             context: Any) -> List[bool]:
+        any_mode = self.mode == "any"
+        # any-of starts with everything denied, all-of with everything granted
+        combined = dict.fromkeys(perms, not any_mode)
+
+        def decisive(result: Dict[Union[str, Enum], bool]) -> bool:
+            for permission in perms:
+                # sub-policies may answer with any truthy or falsy value
+                if bool(result[permission]) is any_mode:
+                    combined[permission] = any_mode
+            return all(access is any_mode for access in combined.values())
+
+        calls = [p.permits_many(identity, perms, context) for p in self.policies]
+        await self._race(calls, dict.fromkeys(perms, False), decisive)
+        return [combined[permission] for permission in perms]
+
+    async def _race(self, calls: Sequence[Awaitable[_T]], on_timeout: _T,
+                    decisive: Callable[[_T], bool]) -> Tuple[bool, List[_T]]:
+        """Run *calls* concurrently until a result is *decisive*.
+
+        Return whether one was and the results received, in completion
+        order. The calls still running are cancelled.
+        """
+        tasks = [asyncio.ensure_future(self._call(index, call, on_timeout))
+                 for index, call in enumerate(calls)]
+        results: List[_T] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                results.append(result)
+                if decisive(result):
+                    return True, results
+            return False, results
+        finally:
+            for task in tasks:
+                if task.done():
+                    _retrieve(task)
+                else:
+                    task.cancel()
+                    task.add_done_callback(_retrieve)
+
+    async def _call(self, index: int, call: Awaitable[_T], on_timeout: _T) -> _T:
+        timeout = self.timeouts[index]
+        if timeout is None:
+            return await call
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s did not answer in %s seconds",
+                           type(self.policies[index]).__name__, timeout)
+            return on_timeout
+
+
+def _retrieve(task: "asyncio.Future[Any]") -> None:
+    # results of calls not needed anymore may be exceptions nobody awaits
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,145 @@
+"""Stack samples of slow security policy calls.
+
+SlowCallProfiler is passed to setup(). Every policy call made by the
+api is watched by a timer; a call still running after *threshold*
+seconds has the await stack of its coroutine sampled periodically, and
+once it completes a report is written to a bounded ring of files.
+
+Calls faster than *threshold* cost a timer scheduled and cancelled.
+Reports are formatted in the event loop but written, and old ones
+removed, by a dedicated thread.
+
+"""
+
+import asyncio
+import logging
+import os
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, List, Optional, Set, Tuple, TypeVar
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+class _Watch:
+
+    __slots__ = ("call", "started", "samples", "handle")
+
+    def __init__(self, call: Awaitable[Any], started: float):
+        self.call = call
+        self.started = started
+        self.samples: List[Tuple[str, ...]] = []
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class SlowCallProfiler:
+    """Write await stack samples of policy calls slower than *threshold*.
+
+    Stacks are sampled every *interval* seconds, *threshold* / 10 by
+    default, up to *max_samples* times per call. Reports are written to
+    *directory*, only the *max_files* most recent ones are kept.
+    """
+
+    def __init__(self, directory: str, threshold: float = 0.1,
+                 interval: Optional[float] = None, max_samples: int = 100,
+                 max_files: int = 20):
+        if threshold <= 0:
+            raise ValueError("threshold should be a positive number.")
+        if max_files <= 0:
+            raise ValueError("max_files should be a positive integer.")
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = threshold / 10 if interval is None else interval
+        self.max_samples = max_samples
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+        # a single thread, so reports are written and pruned in order
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._pending: Set["asyncio.Future[None]"] = set()
+
+    async def flush(self) -> None:
+        """Wait for the reports being written."""
+        if self._pending:
+            await asyncio.gather(*self._pending)
+
+    async def watch(self, request: web.Request, call: Awaitable[_T], details: str) -> _T:
+        """Await *call*, reporting it if it takes longer than threshold."""
+        loop = asyncio.get_running_loop()
+        watch = _Watch(call, loop.time())
+        watch.handle = loop.call_at(watch.started + self.threshold, self._sample, watch)
+        try:
+            return await call
+        finally:
+            watch.handle.cancel()
+            duration = loop.time() - watch.started
+            if duration >= self.threshold:
+                self._report(request, watch, details, duration)
+
+    def _sample(self, watch: _Watch) -> None:
+        watch.samples.append(tuple(_await_stack(watch.call)))
+        if len(watch.samples) < self.max_samples:
+            loop = asyncio.get_running_loop()
+            watch.handle = loop.call_later(self.interval, self._sample, watch)
+
+    def _report(self, request: web.Request, watch: _Watch, details: str,
+                duration: float) -> None:
+        name = getattr(watch.call, "__qualname__", type(watch.call).__qualname__)
+        lines = [
+            "call: {}({})".format(name, details),
+            "request: {} {}".format(request.method, request.path),
+            "duration: {:.3f} s, threshold {:.3f} s".format(duration, self.threshold),
+        ]
+        if watch.samples:
+            lines.append("samples: {}, every {:.3f} s".format(
+                len(watch.samples), self.interval))
+            for stack, count in Counter(watch.samples).most_common():
+                lines.append("")
+                lines.append("{} sample(s):".format(count))
+                lines.extend(stack)
+        else:
+            lines.append("no samples: the event loop was blocked, the call "
+                         "spent its time in synchronous code")
+
+        filename = os.path.join(self.directory, "slow-{}-{}.txt".format(
+            time.time_ns(), name.replace("<", "").replace(">", "")))
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="aiohttp-security-profiler")
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self._writer, self._write, filename,
+                                   "\n".join(lines) + "\n")
+        self._pending.add(fut)
+        fut.add_done_callback(self._pending.discard)
+
+    def _write(self, filename: str, report: str) -> None:
+        try:
+            with open(filename, "w") as f:
+                f.write(report)
+            self._prune()
+        except OSError:
+            logger.warning("Cannot write slow call report %s", filename, exc_info=True)
+
+    def _prune(self) -> None:
+        reports = sorted(name for name in os.listdir(self.directory)
+                         if name.startswith("slow-") and name.endswith(".txt"))
+        for name in reports[:-self.max_files]:
+            os.remove(os.path.join(self.directory, name))
+
+
+def _await_stack(call: Any) -> List[str]:
+    # follow the chain of awaited coroutines down to the innermost one
+    frames = []
+    while call is not None:
+        frame = getattr(call, "cr_frame", None) or getattr(call, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append((frame, frame.f_lineno))
+        call = getattr(call, "cr_await", None) or getattr(call, "gi_yieldfrom", None)
+    return [line for entry in traceback.StackSummary.extract(frames).format()
+            for line in entry.splitlines()]
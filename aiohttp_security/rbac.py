@@ -0,0 +1,105 @@
+"""Role based authorization policy compiled to permission bitmasks.
+
+The role graph is resolved once, when the policy is built: every
+permission is given a bit and every user an int mask of all the
+permissions granted by their roles, the roles those inherit and the
+roles of their groups. A permission check is then a dict lookup and a
+bitwise AND however deep the role hierarchy is.
+
+"""
+
+from enum import Enum
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Union
+
+from .abc import AbstractAuthorizationPolicy
+
+Permission = Union[str, Enum]
+
+
+class RBACAuthorizationPolicy(AbstractAuthorizationPolicy):
+    """Authorization policy granting permissions through roles.
+
+    *roles* maps role names to the permissions they grant, *inherits*
+    role names to the roles whose permissions they include, *groups*
+    group names to their roles and *users* user ids to their roles and
+    groups. Role and group names share one namespace.
+    """
+
+    def __init__(self, roles: Mapping[str, Iterable[Permission]],
+                 users: Mapping[str, Iterable[str]], *,
+                 inherits: Optional[Mapping[str, Iterable[str]]] = None,
+                 groups: Optional[Mapping[str, Iterable[str]]] = None):
+        roles = {role: tuple(permissions) for role, permissions in roles.items()}
+        inherits = inherits or {}
+        groups = groups or {}
+        clash = set(roles) & set(groups)
+        if clash:
+            raise ValueError("Names used both for roles and groups: {}".format(
+                ", ".join(sorted(clash))))
+        for role in inherits:
+            _check(role, roles, "Inheriting role")
+
+        self._bits: Dict[Permission, int] = {}
+        for permissions in roles.values():
+            for permission in permissions:
+                self._bits.setdefault(permission, 1 << len(self._bits))
+
+        role_masks: Dict[str, int] = {}
+        for role in roles:
+            self._role_mask(role, roles, inherits, role_masks, [])
+        names = dict(role_masks)
+        for group, members in groups.items():
+            mask = 0
+            for role in members:
+                mask |= role_masks[_check(role, roles, "Role of group " + group)]
+            names[group] = mask
+
+        self._masks: Dict[Optional[str], int] = {}
+        for user, members in users.items():
+            mask = 0
+            for name in members:
+                mask |= names[_check(name, names, "Role or group of user " + user)]
+            self._masks[user] = mask
+
+    def _role_mask(self, role: str, roles: Mapping[str, Iterable[Permission]],
+                   inherits: Mapping[str, Iterable[str]], masks: Dict[str, int],
+                   path: List[str]) -> int:
+        if role in masks:
+            return masks[role]
+        if role in path:
+            raise ValueError("Role inheritance cycle: {}".format(
+                " -> ".join(path[path.index(role):] + [role])))
+        path.append(role)
+        mask = 0
+        for permission in roles[role]:
+            mask |= self._bits[permission]
+        for parent in inherits.get(role, ()):
+            _check(parent, roles, "Role inherited by " + role)
+            mask |= self._role_mask(parent, roles, inherits, masks, path)
+        path.pop()
+        masks[role] = mask
+        return mask
+
+    async def authorized_userid(self, identity: str) -> Optional[str]:
+        return identity if identity in self._masks else None
+
+    async def permits(self, identity: Optional[str], permission: Permission,
+                      context: Any = None) -> bool:
+        return self._masks.get(identity, 0) & self._bits.get(permission, 0) != 0
+
+    async def permits_many(self, identity: Optional[str], permissions: Iterable[Permission],
+                           context: Any = None) -> Dict[Permission, bool]:
+        mask = self._masks.get(identity, 0)
+        bits = self._bits
+        return {p: mask & bits.get(p, 0) != 0 for p in permissions}
+
+    def effective_permissions(self, identity: str) -> FrozenSet[Permission]:
+        """Return all the permissions granted to *identity*."""
+        mask = self._masks.get(identity, 0)
+        return frozenset(p for p, bit in self._bits.items() if mask & bit)
+
+
+def _check(name: str, known: Mapping[str, Any], what: str) -> str:
+    if name not in known:
+        raise ValueError("{} is unknown: {}".format(what, name))
+    return name
@@ -8,7 +8,7 @@ from typing import Optional
 
 from aiohttp import web
 try:
-    from aiohttp_session import get_session
+    from aiohttp_session import SESSION_KEY, STORAGE_KEY, get_session
     HAS_AIOHTTP_SESSION = True
 except ImportError:  # pragma: no cover
     HAS_AIOHTTP_SESSION = False
@@ -29,6 +29,16 @@ class SessionIdentityPolicy(AbstractIdentityPolicy):
         session = await get_session(request)
         return session.get(self._session_key)
 
+    def has_credentials(self, request: web.Request) -> bool:
+        session = request.get(SESSION_KEY)
+        if session is not None:
+            return self._session_key in session
+        storage = request.get(STORAGE_KEY)
+        if storage is None:
+            return True  # let identify() report the missing middleware
+        # a new session is created for requests without session cookie
+        return storage.cookie_name in request.cookies
+
     async def remember(self, request: web.Request, response: web.StreamResponse,
                        identity: str, **kwargs: object) -> None:
         session = await get_session(request)
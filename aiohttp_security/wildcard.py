@@ -0,0 +1,98 @@
+"""Hierarchical permissions with wildcard grants.
+
+Permissions are strings of segments, e.g. ``articles:42:read``. In a
+grant ``*`` stands for any single segment, and a trailing ``*`` for any
+number of them: ``articles:*:read`` grants reading every article,
+``billing:*`` everything under billing.
+
+Grants are compiled into a segment trie, so checking a permission costs
+a walk over its segments whatever the number of grants.
+
+"""
+
+from enum import Enum
+from typing import Any, Dict, Iterable, Mapping, Optional, Union
+
+from .abc import AbstractAuthorizationPolicy
+
+WILDCARD = "*"
+
+
+class _Node:
+
+    __slots__ = ("children", "granted", "subtree")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _Node] = {}
+        # a grant ends here / a trailing wildcard grants everything below
+        self.granted = False
+        self.subtree = False
+
+
+class PermissionTrie:
+    """Set of wildcard grants, matched against permissions."""
+
+    def __init__(self, grants: Iterable[str] = (), separator: str = ":"):
+        self.separator = separator
+        self._root = _Node()
+        for grant in grants:
+            self.add(grant)
+
+    def add(self, grant: str) -> None:
+        """Add *grant* to the set."""
+        node = self._root
+        for segment in grant.split(self.separator):
+            node = node.children.setdefault(segment, _Node())
+        node.granted = True
+        if segment == WILDCARD:
+            node.subtree = True
+
+    def matches(self, permission: Union[str, Enum]) -> bool:
+        """Return True if a grant covers *permission*."""
+        name = permission.value if isinstance(permission, Enum) else permission
+        if not isinstance(name, str):
+            return False
+        nodes = [self._root]
+        for segment in name.split(self.separator):
+            next_nodes = []
+            for node in nodes:
+                if node.subtree:
+                    return True
+                child = node.children.get(segment)
+                if child is not None:
+                    next_nodes.append(child)
+                child = node.children.get(WILDCARD)
+                if child is not None:
+                    next_nodes.append(child)
+            if not next_nodes:
+                return False
+            nodes = next_nodes
+        return any(node.granted for node in nodes)
+
+
+class WildcardAuthorizationPolicy(AbstractAuthorizationPolicy):
+    """Authorization policy checking permissions against wildcard grants.
+
+    *grants* maps user ids to the permission patterns granted to them,
+    segments being delimited by *separator*.
+    """
+
+    def __init__(self, grants: Mapping[str, Iterable[str]], separator: str = ":"):
+        self._tries: Dict[Optional[str], PermissionTrie] = {
+            user: PermissionTrie(patterns, separator) for user, patterns in grants.items()}
+
+    async def authorized_userid(self, identity: str) -> Optional[str]:
+        return identity if identity in self._tries else None
+
+    async def permits(self, identity: Optional[str], permission: Union[str, Enum],
+                      context: Any = None) -> bool:
+        trie = self._tries.get(identity)
+        return trie is not None and trie.matches(permission)
+
+    async def permits_many(self, identity: Optional[str],
+                           permissions: Iterable[Union[str, Enum]],
+                           context: Any = None) -> Dict[Union[str, Enum], bool]:
+        trie = self._tries.get(identity)
+        if trie is None:
+            return dict.fromkeys(permissions, False)
+        return {p: trie.matches(p) for p in permissions}
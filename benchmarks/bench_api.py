@@ -0,0 +1,212 @@
+"""Micro-benchmarks of the aiohttp_security.api hot path.
+
+Every public api call is timed against each identity policy combined
+with an in-memory authorization policy. Each call gets a fresh request,
+so per-request memoization does not hide the policy cost, and request
+construction is kept out of the timed loop.
+
+For every case the runner reports operations per second (best of
+*repeat* runs) and, measured on separate calls with the garbage
+collector disabled, the memory blocks a single call leaves allocated
+(mostly what is memoized on the request) and its peak memory use as
+traced by tracemalloc.
+
+Results can be saved as JSON and compared with a previous run:
+
+    python benchmarks/bench_api.py --json before.json
+    git checkout other-branch
+    python benchmarks/bench_api.py --compare before.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import jwt
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from aiohttp_session import STORAGE_KEY, SimpleCookieStorage
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from aiohttp_security import (AbstractAuthorizationPolicy, AbstractIdentityPolicy,
+                              CookiesIdentityPolicy, JWTIdentityPolicy,
+                              SessionIdentityPolicy, authorized_userid, check_authorized,
+                              check_permission, forget, is_anonymous, permits, remember,
+                              setup)
+
+IDENTITY = "UserID"
+SECRET = "benchmark-secret"  # noqa: S105
+
+
+class MemoryAuthorizationPolicy(AbstractAuthorizationPolicy):
+
+    def __init__(self, permissions: Dict[str, Set[str]]):
+        self.permissions = permissions
+
+    async def authorized_userid(self, identity: str) -> Optional[str]:
+        return identity if identity in self.permissions else None
+
+    async def permits(self, identity: Optional[str], permission: Any,
+                      context: Any = None) -> bool:
+        return identity is not None and permission in self.permissions.get(identity, ())
+
+
+_RequestFactory = Callable[[], web.Request]
+_Op = Callable[[web.Request], Awaitable[Any]]
+
+
+def cookies_case(app: web.Application) -> _RequestFactory:
+    setup(app, CookiesIdentityPolicy(), MemoryAuthorizationPolicy({IDENTITY: {"read"}}))
+    headers = {"Cookie": "AIOHTTP_SECURITY={}".format(IDENTITY)}
+    return lambda: make_mocked_request("GET", "/", headers=headers, app=app)
+
+
+def session_case(app: web.Application) -> _RequestFactory:
+    setup(app, SessionIdentityPolicy(), MemoryAuthorizationPolicy({IDENTITY: {"read"}}))
+    storage = SimpleCookieStorage()
+    data = json.dumps({"session": {"AIOHTTP_SECURITY": IDENTITY}, "created": int(time.time())})
+    headers = {"Cookie": "AIOHTTP_SESSION={}".format(json.dumps(data))}
+
+    def factory() -> web.Request:
+        request = make_mocked_request("GET", "/", headers=headers, app=app)
+        # done by aiohttp_session middleware in a real application
+        request[STORAGE_KEY] = storage
+        return request
+    return factory
+
+
+def hs256_case(app: web.Application) -> _RequestFactory:
+    setup(app, JWTIdentityPolicy(SECRET), MemoryAuthorizationPolicy({IDENTITY: {"read"}}))
+    token = jwt.encode({"login": IDENTITY}, SECRET, algorithm="HS256")
+    headers = {"Authorization": "Bearer " + token}
+    return lambda: make_mocked_request("GET", "/", headers=headers, app=app)
+
+
+def rs256_case(app: web.Application) -> _RequestFactory:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    policy: AbstractIdentityPolicy = JWTIdentityPolicy(public_pem.decode(), algorithm="RS256")
+    setup(app, policy, MemoryAuthorizationPolicy({IDENTITY: {"read"}}))
+    token = jwt.encode({"login": IDENTITY}, private_key, algorithm="RS256")
+    headers = {"Authorization": "Bearer " + token}
+    return lambda: make_mocked_request("GET", "/", headers=headers, app=app)
+
+
+POLICIES: Dict[str, Callable[[web.Application], _RequestFactory]] = {
+    "cookies": cookies_case,
+    "session": session_case,
+    "jwt-hs256": hs256_case,
+    "jwt-rs256": rs256_case,
+}
+
+OPERATIONS: Dict[str, _Op] = {
+    "remember": lambda request: remember(request, web.Response(), IDENTITY),
+    "forget": lambda request: forget(request, web.Response()),
+    "authorized_userid": authorized_userid,
+    "permits": lambda request: permits(request, "read"),
+    "is_anonymous": is_anonymous,
+    "check_authorized": check_authorized,
+    "check_permission": lambda request: check_permission(request, "read"),
+}
+
+
+def cases(selected: List[str]) -> Iterator[Tuple[str, str, _RequestFactory, _Op]]:
+    for policy_name, make_case in POLICIES.items():
+        ops = [(op_name, op) for op_name, op in OPERATIONS.items()
+               if not selected or any(pattern in "{}/{}".format(policy_name, op_name)
+                                      for pattern in selected)]
+        if ops:
+            factory = make_case(web.Application())
+            for op_name, op in ops:
+                yield policy_name, op_name, factory, op
+
+
+async def ops_per_sec(factory: _RequestFactory, op: _Op, number: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        requests = [factory() for _ in range(number)]
+        started = time.perf_counter()
+        for request in requests:
+            await op(request)
+        best = min(best, time.perf_counter() - started)
+    return number / best
+
+
+async def allocations(factory: _RequestFactory, op: _Op, number: int) -> Tuple[float, float]:
+    """Average (allocated blocks, peak bytes) of a single call."""
+    requests = [factory() for _ in range(number)]
+    await op(factory())  # warm up lazily initialized state
+    blocks = peak = 0
+    gc.disable()
+    try:
+        for request in requests[:number // 2]:
+            before_blocks = sys.getallocatedblocks()
+            await op(request)
+            blocks += sys.getallocatedblocks() - before_blocks
+        tracemalloc.start()
+        for request in requests[number // 2:]:
+            tracemalloc.reset_peak()
+            before_size = tracemalloc.get_traced_memory()[0]
+            await op(request)
+            peak += tracemalloc.get_traced_memory()[1] - before_size
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    return blocks / (number // 2), peak / (number - number // 2)
+
+
+def report(results: Dict[str, Dict[str, float]],
+           baseline: Optional[Dict[str, Dict[str, float]]]) -> None:
+    print("{:<30} {:>12} {:>10} {:>12}{}".format(
+        "case", "ops/sec", "blocks", "peak bytes", "   vs baseline" if baseline else ""))
+    for name, result in results.items():
+        line = "{:<30} {:>12,.0f} {:>10.1f} {:>12,.0f}".format(
+            name, result["ops_per_sec"], result["blocks"], result["peak_bytes"])
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += "   {:+7.1%}".format(result["ops_per_sec"] / previous["ops_per_sec"] - 1)
+        print(line)
+
+
+async def main(args: argparse.Namespace) -> None:
+    results: Dict[str, Dict[str, float]] = {}
+    for policy_name, op_name, factory, op in cases(args.cases):
+        blocks, peak = await allocations(factory, op, args.alloc_number)
+        results["{}/{}".format(policy_name, op_name)] = {
+            "ops_per_sec": await ops_per_sec(factory, op, args.number, args.repeat),
+            "blocks": blocks,
+            "peak_bytes": peak,
+        }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cases", nargs="*",
+                        help="run only cases whose name contains one of these, "
+                             "e.g. 'jwt-rs256' or 'check_permission'")
+    parser.add_argument("--number", type=int, default=1000,
+                        help="calls per timed run")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs per case, the best one is reported")
+    parser.add_argument("--alloc-number", type=int, default=200,
+                        help="calls traced to measure allocations")
+    parser.add_argument("--json", metavar="PATH", help="save results to PATH")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="show ops/sec change relative to results saved in PATH")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""Event loop latency of JWTIdentityPolicy under concurrent load.
+
+Runs *concurrency* tasks identifying RS256/ES256 bearer tokens while a
+probe task measures how late the event loop wakes it up, once with
+verification done inline and once offloaded to a ThreadPoolExecutor.
+
+    python benchmarks/jwt_offload.py --algorithm RS256 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
+
+import jwt
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from aiohttp_security import JWTIdentityPolicy
+
+
+def make_keys(algorithm: str) -> Tuple[Union[ec.EllipticCurvePrivateKey, rsa.RSAPrivateKey], str]:
+    private_key: Union[ec.EllipticCurvePrivateKey, rsa.RSAPrivateKey]
+    if algorithm.startswith("ES"):
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return private_key, public_pem.decode()
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(policy: JWTIdentityPolicy, requests: List[web.Request],
+              concurrency: int, total: int) -> Tuple[List[float], List[float]]:
+    latencies: List[float] = []
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def worker(n: int) -> None:
+        for i in range(n, total, concurrency):
+            started = time.perf_counter()
+            await policy.identify(requests[i % len(requests)])
+            latencies.append(time.perf_counter() - started)
+            # stands for the I/O a real handler would wait for
+            await asyncio.sleep(0)
+
+    async def probe(interval: float = 0.001) -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    done.set()
+    await probe_task
+    return latencies, lags
+
+
+def report(name: str, latencies: List[float], lags: List[float], elapsed: float) -> None:
+    print("{:<8} {:>10.0f} req/s  identify p50 {:7.2f} ms  p99 {:7.2f} ms  "
+          "loop lag p50 {:7.2f} ms  p99 {:7.2f} ms".format(
+              name, len(latencies) / elapsed,
+              statistics.median(latencies) * 1000, percentile(latencies, 99) * 1000,
+              statistics.median(lags) * 1000, percentile(lags, 99) * 1000))
+
+
+async def main(algorithm: str, concurrency: int, total: int,
+               workers: Optional[int]) -> None:
+    private_key, public_pem = make_keys(algorithm)
+    # distinct tokens, so no verification is skipped by caching anywhere
+    tokens = [jwt.encode({"login": "user{}".format(i)}, private_key, algorithm=algorithm)
+              for i in range(256)]
+    requests = [make_mocked_request("GET", "/", headers={"Authorization": "Bearer " + token})
+                for token in tokens]
+
+    for name, executor in (("inline", None),
+                           ("executor", ThreadPoolExecutor(max_workers=workers))):
+        policy = JWTIdentityPolicy(public_pem, algorithm=algorithm, executor=executor)
+        started = time.perf_counter()
+        latencies, lags = await run(policy, requests, concurrency, total)
+        report(name, latencies, lags, time.perf_counter() - started)
+        if executor is not None:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--algorithm", default="RS256", choices=("RS256", "ES256"))
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", dest="total", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="executor threads, defaults to ThreadPoolExecutor default")
+    args = parser.parse_args()
+    asyncio.run(main(args.algorithm, args.concurrency, args.total, args.workers))
@@ -0,0 +1,221 @@
+"""End-to-end load test of the demo applications.
+
+Serves a demo application in-process on localhost and drives it with
+*concurrency* aiohttp clients for *duration* seconds per scenario, and
+at least until *min_requests* requests were answered:
+
+- ``login``: POST /login with valid credentials,
+- ``protected``: GET /protected with the session cookie of a logged in user,
+- ``anonymous``: GET / without any cookie.
+
+Throughput and p50/p95/p99 latency of every app/scenario pair are
+compared against the baseline stored in benchmarks/load_test_baseline.json,
+the run exits with status 1 if p99 latency grew or throughput dropped by
+more than *threshold*. Cases whose baseline has fewer than *min_requests*
+samples are reported but not gated. Run from the repository root:
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test database --duration 10 --threshold 0.3
+    python -m benchmarks.load_test --update-baseline
+
+The database demo stores users in an in-memory SQLite database, it needs
+``aiosqlite`` in addition to the development requirements. Its login
+verifies a sha256_crypt hash, so login throughput is bounded by hashing
+and that scenario runs until its minimum request count, well past
+*duration*.
+
+Client and server share the event loop, so absolute numbers understate
+a real deployment; baselines are only comparable on the same machine.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from aiohttp import ClientSession, DummyCookieJar, TCPConnector, web
+from aiohttp.test_utils import TestServer
+
+BASELINE = Path(__file__).with_name("load_test_baseline.json")
+SCENARIOS = ("login", "protected", "anonymous")
+# password of the sample users of both demo applications
+PASSWORD = "password"  # noqa: S105
+
+_Result = Dict[str, float]
+
+
+async def dictionary_app() -> Tuple[web.Application, Dict[str, str]]:
+    from demo.dictionary_auth.main import make_app  # noqa: I900
+    return make_app(), {"username": "jack", "password": PASSWORD}
+
+
+async def database_app() -> Tuple[web.Application, Dict[str, str]]:
+    from demo.database_auth.main import init_app  # noqa: I900
+    return await init_app(), {"login": "moderator", "password": PASSWORD}
+
+
+APPS: Dict[str, Callable[[], Awaitable[Tuple[web.Application, Dict[str, str]]]]] = {
+    "dictionary": dictionary_app,
+    "database": database_app,
+}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def login_cookie(session: ClientSession, server: TestServer,
+                       credentials: Mapping[str, str]) -> str:
+    async with session.post(server.make_url("/login"), data=credentials,
+                            allow_redirects=False) as resp:
+        if resp.status != 302:
+            raise RuntimeError("Login failed with status {}".format(resp.status))
+        return "; ".join("{}={}".format(name, morsel.value)
+                         for name, morsel in resp.cookies.items())
+
+
+async def drive(session: ClientSession, server: TestServer, scenario: str,
+                credentials: Mapping[str, str], concurrency: int,
+                duration: float, min_requests: int) -> _Result:
+    if scenario == "login":
+        method, path, data, expected = "POST", "/login", credentials, 302
+        headers = {}
+    elif scenario == "protected":
+        method, path, data, expected = "GET", "/protected", None, 200
+        headers = {"Cookie": await login_cookie(session, server, credentials)}
+    else:
+        method, path, data, expected = "GET", "/", None, 200
+        headers = {}
+    url = server.make_url(path)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(deadline: float) -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline or len(latencies) < min_requests:
+            started = time.perf_counter()
+            async with session.request(method, url, data=data, headers=headers,
+                                       allow_redirects=False) as resp:
+                await resp.read()
+            latencies.append(time.perf_counter() - started)
+            if resp.status != expected:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(started + duration) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50": round(percentile(latencies, 50) * 1000, 3),
+        "p95": round(percentile(latencies, 95) * 1000, 3),
+        "p99": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run(apps: List[str], concurrency: int, duration: float,
+              min_requests: int) -> Dict[str, _Result]:
+    results: Dict[str, _Result] = {}
+    for name in apps:
+        app, credentials = await APPS[name]()
+        server = TestServer(app, host="127.0.0.1")
+        await server.start_server()
+        try:
+            async with ClientSession(connector=TCPConnector(limit=concurrency),
+                                     cookie_jar=DummyCookieJar()) as session:
+                for scenario in SCENARIOS:
+                    results["{}/{}".format(name, scenario)] = await drive(
+                        session, server, scenario, credentials, concurrency, duration,
+                        min_requests)
+        finally:
+            await server.close()
+    return results
+
+
+def regressions(results: Mapping[str, _Result], baseline: Mapping[str, _Result],
+                threshold: float, min_requests: int) -> List[str]:
+    found = []
+    for name, result in results.items():
+        if result["errors"]:
+            found.append("{}: {:.0f} unexpected responses".format(name, result["errors"]))
+        previous = baseline.get(name)
+        if previous is None or previous["requests"] < min_requests:
+            continue
+        if result["p99"] > previous["p99"] * (1 + threshold):
+            found.append("{}: p99 {:.2f} ms, baseline {:.2f} ms".format(
+                name, result["p99"], previous["p99"]))
+        if result["rps"] < previous["rps"] * (1 - threshold):
+            found.append("{}: {:.0f} req/s, baseline {:.0f} req/s".format(
+                name, result["rps"], previous["rps"]))
+    return found
+
+
+def report(results: Mapping[str, _Result], baseline: Mapping[str, _Result],
+           min_requests: int) -> None:
+    print("{:<24} {:>9} {:>9} {:>9} {:>9} {:>11}".format(
+        "case", "req/s", "p50 ms", "p95 ms", "p99 ms", "p99 vs base"))
+    for name, result in results.items():
+        previous: Optional[_Result] = baseline.get(name)
+        if previous is None:
+            change = "-"
+        elif previous["requests"] < min_requests:
+            change = "not gated"
+        else:
+            change = "{:+.1%}".format(result["p99"] / previous["p99"] - 1)
+        print("{:<24} {:>9.0f} {:>9.2f} {:>9.2f} {:>9.2f} {:>11}".format(
+            name, result["rps"], result["p50"], result["p95"], result["p99"], change))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("apps", nargs="*",
+                        help="demo applications to run: {}, all by default".format(
+                            ", ".join(APPS)))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="seconds per scenario")
+    parser.add_argument("--min-requests", type=int, default=200,
+                        help="requests per scenario, however long they take")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="tolerated relative regression, 0.2 stands for 20%%")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store results as the new baseline instead of comparing")
+    args = parser.parse_args()
+    unknown = set(args.apps) - set(APPS)
+    if unknown:
+        parser.error("unknown application: {}".format(", ".join(sorted(unknown))))
+
+    results = asyncio.run(run(args.apps or list(APPS), args.concurrency, args.duration,
+                              args.min_requests))
+    stored: Dict[str, _Result] = {}
+    if args.baseline.exists():
+        stored = json.loads(args.baseline.read_text())["results"]
+
+    if args.update_baseline:
+        report(results, {}, args.min_requests)
+        args.baseline.write_text(json.dumps({
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "min_requests": args.min_requests,
+            "results": {**stored, **results},
+        }, indent=2) + "\n")
+        return 0
+
+    report(results, stored, args.min_requests)
+    found = regressions(results, stored, args.threshold, args.min_requests)
+    for line in found:
+        print("REGRESSION " + line, file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
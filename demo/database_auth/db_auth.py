@@ -1,3 +1,4 @@
+from collections.abc import Iterable
 from enum import Enum
 
 import sqlalchemy as sa
@@ -39,6 +40,24 @@ class DBAuthorizationPolicy(AbstractAuthorizationPolicy):
             return True
         return any(p.name == permission for p in user.permissions)
 
+    async def permits_many(self, identity: str | None, permissions: Iterable[str | Enum],
+                           context: dict[str, object] | None = None) -> dict[str | Enum, bool]:
+        perms = list(dict.fromkeys(permissions))
+        if identity is None:
+            return dict.fromkeys(perms, False)
+
+        where = _where_authorized(identity)
+        stmt = sa.select(User).options(selectinload(User.permissions)).where(*where)
+        async with self.dbsession() as sess:
+            user = await sess.scalar(stmt)
+
+        if user is None:
+            return dict.fromkeys(perms, False)
+        if user.is_superuser:
+            return dict.fromkeys(perms, True)
+        granted = {p.name for p in user.permissions}
+        return {p: p in granted for p in perms}
+
 
 async def check_credentials(db_session: async_sessionmaker[AsyncSession],
                             username: str, password: str) -> bool:
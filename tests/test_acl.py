@@ -0,0 +1,156 @@
+from typing import Dict, Iterable, List, Optional
+
+import pytest
+from aiohttp import web
+
+from aiohttp_security import (ACLAuthorizationPolicy, ALL_PERMISSIONS, Allow, Authenticated,
+                              CookiesIdentityPolicy, DENY_ALL, Deny, Everyone,
+                              check_permission, remember)
+from aiohttp_security import acl
+from aiohttp_security import setup as _setup
+
+GROUPS: Dict[str, List[str]] = {'alice': ['group:editors'], 'bob': ['group:editors'],
+                                'carol': ['group:admins'], 'dave': []}
+
+
+async def groupfinder(identity: str) -> Optional[Iterable[str]]:
+    return GROUPS.get(identity)
+
+
+class Blog:
+    __acl__ = [(Allow, 'group:admins', ALL_PERMISSIONS),
+               (Allow, Authenticated, 'comment')]
+
+
+class Article:
+    __acl__ = [(Deny, 'bob', 'edit'),
+               (Allow, Everyone, 'view'),
+               (Allow, 'group:editors', ('view', 'edit')),
+               DENY_ALL]
+
+    def __init__(self, parent: Optional[Blog] = None) -> None:
+        self.__parent__ = parent
+
+
+class Draft(Article):
+    __acl__ = [(Allow, 'group:editors', 'view'), DENY_ALL]
+
+
+class Page:
+
+    def __init__(self, owner: str) -> None:
+        self.owner = owner
+        self.__parent__ = Blog()
+
+    def __acl__(self):
+        return [(Allow, self.owner, 'edit')]
+
+
+@pytest.fixture
+def policy():
+    return ACLAuthorizationPolicy(groupfinder)
+
+
+async def test_first_matching_entry_decides(policy):
+    article = Article()
+    assert await policy.permits(None, 'view', article)
+    assert await policy.permits('alice', 'edit', article)
+    assert not await policy.permits('bob', 'edit', article)
+    assert not await policy.permits('dave', 'edit', article)
+    assert not await policy.permits('alice', 'delete', article)
+    assert not await policy.permits('alice', 'view', None)
+
+
+async def test_parent(policy):
+    blog = Blog()
+    article = Article(blog)
+    # DENY_ALL of the article hides the ACL of the blog
+    assert not await policy.permits('carol', 'delete', article)
+    article.__acl__ = [(Allow, Authenticated, 'comment')]
+    assert await policy.permits('dave', 'comment', article)
+    assert not await policy.permits(None, 'comment', article)
+    assert await policy.permits('carol', 'delete', blog)
+
+
+async def test_instance_additions(policy):
+    article = Article()
+    article.__acl__ = [(Allow, 'dave', 'edit')]
+    assert await policy.permits('dave', 'edit', article)
+    assert not await policy.permits('bob', 'edit', article)
+    assert await policy.permits('alice', 'edit', article)
+    assert not await policy.permits('dave', 'edit', Article())
+
+
+async def test_compiled_once_per_class(policy, monkeypatch):
+    compiled = []
+
+    class Spy(acl._CompiledACL):
+        def __init__(self, entries):
+            compiled.append(entries)
+            super().__init__(entries)
+
+    monkeypatch.setattr(acl, '_CompiledACL', Spy)
+    for _ in range(3):
+        assert await policy.permits('alice', 'edit', Article())
+        assert not await policy.permits('alice', 'edit', Draft())
+    assert [Article.__acl__, Draft.__acl__] == compiled
+
+    monkeypatch.setattr(Draft, '__acl__', [(Allow, 'group:editors', 'edit')])
+    assert await policy.permits('alice', 'edit', Draft())
+    assert 3 == len(compiled)
+
+
+async def test_callable_acl(policy):
+    assert await policy.permits('dave', 'edit', Page('dave'))
+    assert not await policy.permits('alice', 'edit', Page('dave'))
+    assert await policy.permits('carol', 'edit', Page('dave'))
+
+
+async def test_permits_many(policy):
+    expected = {'view': True, 'edit': False, 'comment': False}
+    assert expected == await policy.permits_many('bob', expected, Article(Blog()))
+    assert {'view': False} == await policy.permits_many('bob', ['view'])
+
+
+async def test_principals(policy):
+    assert {Everyone} == await policy.principals(None)
+    assert {Everyone} == await policy.principals('erin')
+    assert {Everyone, Authenticated, 'alice', 'group:editors'} == \
+        await policy.principals('alice')
+    assert 'alice' == await policy.authorized_userid('alice')
+    assert await policy.authorized_userid('erin') is None
+    assert 'erin' == await ACLAuthorizationPolicy().authorized_userid('erin')
+    assert Authenticated in await ACLAuthorizationPolicy().principals('erin')
+
+
+async def test_invalid_action(policy):
+    class Broken:
+        __acl__ = [('Maybe', Everyone, 'view')]
+
+    with pytest.raises(ValueError):
+        await policy.permits('alice', 'view', Broken())
+
+
+async def test_with_api(aiohttp_client, policy):
+    article = Article()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, request.match_info['user'])
+        raise response
+
+    async def edit(request):
+        await check_permission(request, 'edit', context=article)
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), policy)
+    app.router.add_route('POST', '/login/{user}', login)
+    app.router.add_route('POST', '/edit', edit)
+    client = await aiohttp_client(app)
+
+    assert 401 == (await client.post('/edit')).status
+    await client.post('/login/bob')
+    assert 403 == (await client.post('/edit')).status
+    await client.post('/login/alice')
+    assert 200 == (await client.post('/edit')).status
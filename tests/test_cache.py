@@ -0,0 +1,155 @@
+import enum
+
+import pytest
+
+from aiohttp_security import (AbstractAuthorizationPolicy, CachedAuthorizationPolicy,
+                              FlagAuthorizationPolicy)
+from aiohttp_security.cache import CacheInfo, TTLCache
+
+
+class Clock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Autz(AbstractAuthorizationPolicy):
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[object, ...]] = []
+
+    async def permits(self, identity, permission, context=None):
+        self.calls.append(('permits', identity, permission))
+        return identity == 'UserID' and permission == 'read'
+
+    async def authorized_userid(self, identity):
+        self.calls.append(('authorized_userid', identity))
+        return 'Andrew' if identity == 'UserID' else None
+
+
+def test_ttl_cache_lru_eviction():
+    cache: TTLCache[str, int] = TTLCache(2, 10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert 1 == cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert 1 == cache.get('a')
+    assert 3 == cache.get('c')
+    assert CacheInfo(hits=3, misses=1, evictions=1, maxsize=2, currsize=2) == cache.cache_info()
+
+
+def test_ttl_cache_expiry():
+    clock = Clock()
+    cache: TTLCache[str, int] = TTLCache(10, 10, timer=clock)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=30)
+    cache.set('c', 3, ttl=0)
+    clock.now = 10
+    assert cache.get('a') is None
+    assert 2 == cache.get('b')
+    assert cache.get('c') is None
+    assert 1 == len(cache)
+
+
+def test_ttl_cache_rejects_bad_maxsize():
+    with pytest.raises(ValueError):
+        TTLCache(0, 10)
+
+
+def test_inner_policy_is_checked():
+    with pytest.raises(ValueError):
+        CachedAuthorizationPolicy(object())  # type: ignore[arg-type]
+
+
+async def test_cached_authorized_userid():
+    inner = Autz()
+    policy = CachedAuthorizationPolicy(inner, negative_ttl=0)
+    for _ in range(3):
+        assert 'Andrew' == await policy.authorized_userid('UserID')
+        assert await policy.authorized_userid('Unknown') is None
+    assert [
+        ('authorized_userid', 'UserID'),
+        ('authorized_userid', 'Unknown'),
+        ('authorized_userid', 'Unknown'),
+        ('authorized_userid', 'Unknown'),
+    ] == inner.calls
+
+
+async def test_cached_permits_expiry():
+    clock = Clock()
+    inner = Autz()
+    policy = CachedAuthorizationPolicy(inner, ttl=60, negative_ttl=5, timer=clock)
+    assert await policy.permits('UserID', 'read')
+    assert not await policy.permits('UserID', 'write')
+    clock.now = 10
+    assert await policy.permits('UserID', 'read')
+    assert not await policy.permits('UserID', 'write')
+    assert [
+        ('permits', 'UserID', 'read'),
+        ('permits', 'UserID', 'write'),
+        ('permits', 'UserID', 'write'),
+    ] == inner.calls
+    info = policy.cache_info()
+    assert (1, 3) == (info.hits, info.misses)
+
+
+async def test_cached_permits_unhashable_context():
+    inner = Autz()
+    policy = CachedAuthorizationPolicy(inner)
+    assert await policy.permits('UserID', 'read', {})
+    assert await policy.permits('UserID', 'read', {})
+    assert {'read': True} == await policy.permits_many('UserID', ['read'], {})
+    assert 3 == len(inner.calls)
+
+
+async def test_cached_permits_many():
+    inner = Autz()
+    policy = CachedAuthorizationPolicy(inner)
+    assert await policy.permits('UserID', 'read')
+    ret = await policy.permits_many('UserID', ['write', 'read'])
+    assert {'write': False, 'read': True} == ret
+    assert ['write', 'read'] == list(ret)
+    assert {'write': False} == await policy.permits_many('UserID', ['write'])
+    assert [('permits', 'UserID', 'read'), ('permits', 'UserID', 'write')] == inner.calls
+
+
+async def test_invalidate():
+    inner = Autz()
+    policy = CachedAuthorizationPolicy(inner)
+    await policy.permits('UserID', 'read')
+    await policy.permits('Other', 'read')
+    policy.invalidate('UserID')
+    await policy.permits('UserID', 'read')
+    await policy.permits('Other', 'read')
+    assert 3 == len(inner.calls)
+    policy.invalidate()
+    assert 0 == policy.cache_info().currsize
+
+
+class Article(enum.IntFlag):
+    READ = 1
+
+
+class Billing(enum.IntFlag):
+    ADMIN = 1
+
+
+async def test_cached_per_permission_type():
+    # members of different flags with the same value are different permissions
+    policy = CachedAuthorizationPolicy(
+        FlagAuthorizationPolicy(Article, {'UserID': Article.READ}))
+    assert await policy.permits('UserID', Article.READ)
+    assert not await policy.permits('UserID', Billing.ADMIN)
+    assert {Article.READ: False} == await policy.permits_many(
+        'UserID', [Article.READ, Billing.ADMIN])
+
+    policy = CachedAuthorizationPolicy(
+        FlagAuthorizationPolicy(Article, {'UserID': Article.READ}))
+    assert {Billing.ADMIN: False} == await policy.permits_many(
+        'UserID', [Billing.ADMIN, Article.READ])
+    assert await policy.permits('UserID', Article.READ)
+    assert 2 == policy.cache_info().currsize
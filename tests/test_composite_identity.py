@@ -0,0 +1,146 @@
+import jwt
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from aiohttp_session import SimpleCookieStorage
+from aiohttp_session import setup as setup_session
+
+from aiohttp_security import (AbstractAuthorizationPolicy, CompositeIdentityPolicy,
+                              CookiesIdentityPolicy, JWTIdentityPolicy,
+                              SessionIdentityPolicy, authorized_userid, forget, remember)
+from aiohttp_security import setup as setup_security
+
+SECRET = 'Key'  # noqa: S105
+
+
+class Autz(AbstractAuthorizationPolicy):
+
+    async def permits(self, identity, permission, context=None):
+        return True
+
+    async def authorized_userid(self, identity):
+        return identity
+
+
+class CountingSessionIdentityPolicy(SessionIdentityPolicy):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.identified = 0
+
+    async def identify(self, request):
+        self.identified += 1
+        return await super().identify(request)
+
+
+@pytest.fixture
+def session_policy():
+    return CountingSessionIdentityPolicy()
+
+
+@pytest.fixture
+def make_client(aiohttp_client, session_policy):
+    async def factory():
+
+        async def login(request: web.Request) -> web.Response:
+            response = web.Response()
+            await remember(request, response, 'Andrew')
+            return response
+
+        async def relogin(request):
+            # the request is identified first, remember() then goes to
+            # the policy which identified it
+            await authorized_userid(request)
+            return await login(request)
+
+        async def logout(request):
+            response = web.Response()
+            await forget(request, response)
+            return response
+
+        async def whoami(request):
+            return web.Response(text=str(await authorized_userid(request)))
+
+        policy = CompositeIdentityPolicy(JWTIdentityPolicy(SECRET), session_policy,
+                                         default=session_policy)
+        app = web.Application()
+        setup_session(app, SimpleCookieStorage())
+        setup_security(app, policy, Autz())
+        app.router.add_route('POST', '/login', login)
+        app.router.add_route('POST', '/relogin', relogin)
+        app.router.add_route('POST', '/logout', logout)
+        app.router.add_route('GET', '/', whoami)
+        return await aiohttp_client(app)
+    return factory
+
+
+async def test_bearer_token_skips_session(make_client, session_policy):
+    client = await make_client()
+    token = jwt.encode({'login': 'Bot'}, SECRET)
+    resp = await client.get('/', headers={'Authorization': 'Bearer ' + token})
+    assert 'Bot' == await resp.text()
+    assert 0 == session_policy.identified
+
+    # remember() is routed to the policy which identified the request,
+    # the no-op JWTIdentityPolicy.remember() does not create a session
+    resp = await client.post('/relogin', headers={'Authorization': 'Bearer ' + token})
+    assert 200 == resp.status
+    assert 'AIOHTTP_SESSION' not in resp.cookies
+    assert 0 == session_policy.identified
+
+
+async def test_session_login_logout(make_client, session_policy):
+    client = await make_client()
+    resp = await client.get('/')
+    assert 'None' == await resp.text()
+    assert 0 == session_policy.identified
+
+    resp = await client.post('/login')
+    assert 200 == resp.status
+    resp = await client.get('/')
+    assert 'Andrew' == await resp.text()
+    assert 1 == session_policy.identified
+
+    resp = await client.post('/logout')
+    assert 200 == resp.status
+    resp = await client.get('/')
+    assert 'None' == await resp.text()
+
+
+async def test_login_with_stale_token(make_client, session_policy):
+    # remember() of a request not identified yet does not verify the
+    # token, the session is created by the default policy
+    client = await make_client()
+    resp = await client.post('/login', headers={'Authorization': 'Bearer stale'})
+    assert 200 == resp.status
+    assert 'AIOHTTP_SESSION' in resp.cookies
+    assert 0 == session_policy.identified
+
+    resp = await client.get('/')
+    assert 'Andrew' == await resp.text()
+
+    # forget() of a request not identified yet does not verify either
+    resp = await client.post('/logout', headers={'Authorization': 'Bearer stale'})
+    assert 200 == resp.status
+    assert 1 == session_policy.identified
+    resp = await client.get('/')
+    assert 'None' == await resp.text()
+
+
+async def test_has_credentials():
+    policy = CompositeIdentityPolicy(JWTIdentityPolicy(SECRET), CookiesIdentityPolicy())
+    assert not policy.has_credentials(make_mocked_request('GET', '/'))
+    request = make_mocked_request('GET', '/', headers={'Authorization': 'Basic Zm9v'})
+    assert not policy.has_credentials(request)
+    request = make_mocked_request('GET', '/', headers={'Cookie': 'AIOHTTP_SECURITY=Andrew'})
+    assert policy.has_credentials(request)
+    assert 'Andrew' == await policy.identify(request)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        CompositeIdentityPolicy()
+    with pytest.raises(ValueError):
+        CompositeIdentityPolicy(object())  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        CompositeIdentityPolicy(CookiesIdentityPolicy(), default=CookiesIdentityPolicy())
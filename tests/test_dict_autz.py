@@ -1,11 +1,14 @@
+import asyncio
 import enum
 
+import pytest
 from aiohttp import web
 
 from aiohttp_security import (
-    AbstractAuthorizationPolicy, authorized_userid, check_authorized, check_permission, forget,
-    is_anonymous, permits, remember)
+    AbstractAuthorizationPolicy, authorized_userid, check_authorized, check_permission,
+    check_permissions, forget, is_anonymous, permits, permits_many, remember)
 from aiohttp_security import setup as _setup
+from aiohttp_security.api import CONTEXT_CACHE_KEY, CONTEXT_KEY
 from aiohttp_security.cookies_identity import CookiesIdentityPolicy
 
 
@@ -250,3 +253,530 @@ async def test_check_permission(aiohttp_client):
     assert web.HTTPUnauthorized.status_code == resp.status
     resp = await client.get('/permission/forbid')
     assert web.HTTPUnauthorized.status_code == resp.status
+
+
+async def test_identify_called_once_per_request(aiohttp_client):
+    calls = []
+
+    class CountingIdentityPolicy(CookiesIdentityPolicy):
+
+        async def identify(self, request):
+            calls.append(request.path)
+            return await super().identify(request)
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    async def check(request):
+        assert not await is_anonymous(request)
+        await check_permission(request, 'read')
+        assert await permits(request, 'write')
+        assert 'Andrew' == await authorized_userid(request)
+        return web.Response()
+
+    async def logout(request):
+        assert not await is_anonymous(request)
+        response = web.Response()
+        await forget(request, response)
+        await is_anonymous(request)
+        return response
+
+    app = web.Application()
+    _setup(app, CountingIdentityPolicy(), Autz())
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('POST', '/login', login)
+    app.router.add_route('POST', '/logout', logout)
+    client = await aiohttp_client(app)
+
+    await client.post('/login', allow_redirects=False)
+    calls.clear()
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert ['/'] == calls
+
+    calls.clear()
+    resp = await client.post('/logout')
+    assert 200 == resp.status
+    # forget() drops the memoized identity, so it is resolved again.
+    assert ['/logout', '/logout'] == calls
+
+
+class SlowIdentityPolicy(CookiesIdentityPolicy):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    async def identify(self, request):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return await super().identify(request)
+
+
+async def test_concurrent_calls_share_identify(aiohttp_client):
+    identity_policy = SlowIdentityPolicy()
+    autz = CountingAutz()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    async def check(request):
+        results = await asyncio.gather(
+            authorized_userid(request), authorized_userid(request),
+            permits(request, 'read'), is_anonymous(request))
+        assert ('Andrew', 'Andrew', True, False) == tuple(results)
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, identity_policy, autz)
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('POST', '/login', login)
+    client = await aiohttp_client(app)
+
+    await client.post('/login', allow_redirects=False)
+    identity_policy.calls = 0
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 1 == identity_policy.calls
+    assert 1 == autz.calls.count(('authorized_userid', 'UserID'))
+
+
+async def test_cancelled_identify_is_taken_over(aiohttp_client):
+    identity_policy = SlowIdentityPolicy()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    async def check(request):
+        first = asyncio.ensure_future(authorized_userid(request))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(authorized_userid(request))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert 'Andrew' == await second
+        assert first.cancelled()
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, identity_policy, Autz())
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('POST', '/login', login)
+    client = await aiohttp_client(app)
+
+    await client.post('/login', allow_redirects=False)
+    identity_policy.calls = 0
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 2 == identity_policy.calls
+
+
+async def test_failed_identify_not_memoized(aiohttp_client):
+    calls = []
+
+    class FailingIdentityPolicy(CookiesIdentityPolicy):
+
+        async def identify(self, request):
+            calls.append(request.path)
+            await asyncio.sleep(0)
+            if len(calls) == 1:
+                raise RuntimeError('backend unavailable')
+            return await super().identify(request)
+
+    async def check(request):
+        results = await asyncio.gather(is_anonymous(request), is_anonymous(request),
+                                       return_exceptions=True)
+        assert [RuntimeError, RuntimeError] == [type(r) for r in results]
+        assert await is_anonymous(request)
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, FailingIdentityPolicy(), Autz())
+    app.router.add_route('GET', '/', check)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert ['/', '/'] == calls
+
+
+class CountingAutz(AbstractAuthorizationPolicy):
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, object]] = []
+
+    async def permits(self, identity, permission, context=None):
+        self.calls.append(('permits', permission))
+        return identity == 'UserID' and permission in {'read', 'write'}
+
+    async def authorized_userid(self, identity):
+        self.calls.append(('authorized_userid', identity))
+        return 'Andrew' if identity == 'UserID' else None
+
+
+async def test_decisions_cached_per_request(aiohttp_client):
+    autz = CountingAutz()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    async def check(request):
+        for _ in range(3):
+            assert await permits(request, 'read')
+            assert not await permits(request, 'forbid')
+            assert await permits(request, 'read', context={'unhashable': True})
+            assert 'Andrew' == await authorized_userid(request)
+        await check_permission(request, 'read')
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), autz)
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('POST', '/login', login)
+    client = await aiohttp_client(app)
+
+    await client.post('/login', allow_redirects=False)
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert [
+        ('permits', 'read'),
+        ('permits', 'forbid'),
+        ('permits', 'read'),
+        ('authorized_userid', 'UserID'),
+        ('permits', 'read'),
+        ('permits', 'read'),
+    ] == autz.calls
+
+    # The cache lives on the request, next request asks the policy again.
+    autz.calls.clear()
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert ('permits', 'forbid') in autz.calls
+
+
+async def test_decisions_cache_disabled(aiohttp_client):
+    autz = CountingAutz()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    async def check(request):
+        assert await permits(request, 'read')
+        assert await permits(request, 'read')
+        assert 'Andrew' == await authorized_userid(request)
+        assert 'Andrew' == await authorized_userid(request)
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), autz, cache_decisions=False)
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('POST', '/login', login)
+    client = await aiohttp_client(app)
+
+    await client.post('/login', allow_redirects=False)
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert [
+        ('permits', 'read'),
+        ('permits', 'read'),
+        ('authorized_userid', 'UserID'),
+        ('authorized_userid', 'UserID'),
+    ] == autz.calls
+
+
+async def test_permits_many(aiohttp_client):
+
+    class BulkAutz(CountingAutz):
+
+        async def permits_many(self, identity, permissions, context=None):
+            self.calls.append(('permits_many', tuple(permissions)))
+            return {p: identity == 'UserID' and p in {'read', 'write'}
+                    for p in permissions}
+
+    autz = BulkAutz()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    async def check(request):
+        assert await permits(request, 'read')
+        ret = await permits_many(request, ['read', 'write', 'forbid', 'write'])
+        assert {'read': True, 'write': True, 'forbid': False} == ret
+        assert ['read', 'write', 'forbid'] == list(ret)
+        ret = await permits_many(request, ['forbid', 'read'])
+        assert {'forbid': False, 'read': True} == ret
+        await check_permissions(request, ['read', 'write'])
+        with pytest.raises(web.HTTPForbidden) as ctx:
+            await check_permissions(request, ['read', 'forbid', 'other'])
+        assert "User does not have 'forbid', 'other' permission" == ctx.value.reason
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), autz)
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('POST', '/login', login)
+    client = await aiohttp_client(app)
+
+    await client.post('/login', allow_redirects=False)
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert [
+        ('permits', 'read'),
+        ('permits_many', ('write', 'forbid')),
+        ('authorized_userid', 'UserID'),
+        ('permits_many', ('other',)),
+    ] == autz.calls
+
+
+async def test_permits_many_default_fan_out(aiohttp_client):
+    autz = CountingAutz()
+
+    async def check(request):
+        ret = await permits_many(request, ['read', 'write'], context=[])
+        assert {'read': False, 'write': False} == ret
+        with pytest.raises(web.HTTPUnauthorized):
+            await check_permissions(request, ['read'])
+        with pytest.raises(ValueError):
+            await permits_many(request, ['read', None])  # type: ignore[list-item]
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), autz)
+    app.router.add_route('GET', '/', check)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert [('permits', 'read'), ('permits', 'write')] == autz.calls
+
+
+async def test_security_context_of_subapps(aiohttp_client):
+
+    async def check(request):
+        assert 'Andrew' == await authorized_userid(request)
+        security = request[CONTEXT_CACHE_KEY][request.app]
+        assert security is request.config_dict[CONTEXT_KEY]
+        return web.Response(text=type(security.identity_policy).__name__)
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    class OtherIdentityPolicy(CookiesIdentityPolicy):
+        pass
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), Autz())
+    app.router.add_route('POST', '/login', login)
+    inherited = web.Application()
+    inherited.router.add_route('GET', '/', check)
+    app.add_subapp('/inherited', inherited)
+    own = web.Application()
+    _setup(own, OtherIdentityPolicy(), Autz())
+    own.router.add_route('GET', '/', check)
+    app.add_subapp('/own', own)
+    client = await aiohttp_client(app)
+    await client.post('/login', allow_redirects=False)
+
+    resp = await client.get('/inherited/')
+    assert 'CookiesIdentityPolicy' == await resp.text()
+    resp = await client.get('/own/')
+    assert 'OtherIdentityPolicy' == await resp.text()
+
+
+async def test_security_context_per_app(aiohttp_client):
+    # a middleware of the parent application resolves its own context
+    # first, the sub-application handler still gets the context of the
+    # sub-application
+
+    @web.middleware
+    async def parent_middleware(request, handler):
+        assert await authorized_userid(request) is None
+        assert await is_anonymous(request)
+        return await handler(request)
+
+    async def check(request):
+        assert not await is_anonymous(request)
+        return web.Response(text=await authorized_userid(request))
+
+    class UserIdentityPolicy(CookiesIdentityPolicy):
+
+        async def identify(self, request):
+            return 'UserID'
+
+    app = web.Application(middlewares=[parent_middleware])
+    _setup(app, CookiesIdentityPolicy(), Autz())
+    sub = web.Application()
+    _setup(sub, UserIdentityPolicy(), Autz())
+    sub.router.add_route('GET', '/', check)
+    app.add_subapp('/sub', sub)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/sub/')
+    assert 200 == resp.status
+    assert 'Andrew' == await resp.text()
+
+
+async def test_cache_decisions_inherited_by_subapps(aiohttp_client):
+
+    async def check(request):
+        assert await permits(request, 'read')
+        assert await permits(request, 'read')
+        return web.Response()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), CountingAutz(), cache_decisions=False)
+    app.router.add_route('POST', '/login', login)
+    subapps = {}
+    for name, cache_decisions in (('inherited', None), ('own', True)):
+        autz = subapps[name] = CountingAutz()
+        subapp = web.Application()
+        _setup(subapp, CookiesIdentityPolicy(), autz, cache_decisions=cache_decisions)
+        subapp.router.add_route('GET', '/', check)
+        app.add_subapp('/' + name, subapp)
+    client = await aiohttp_client(app)
+    await client.post('/login', allow_redirects=False)
+
+    assert 200 == (await client.get('/inherited/')).status
+    assert [('permits', 'read')] * 2 == subapps['inherited'].calls
+    assert 200 == (await client.get('/own/')).status
+    assert [('permits', 'read')] == subapps['own'].calls
+
+
+class Article(enum.IntFlag):
+    READ = 1
+
+
+class Billing(enum.IntFlag):
+    ADMIN = 1
+
+
+class Role(str, enum.Enum):
+    ADMIN = 'admin'
+
+
+class TypedAutz(AbstractAuthorizationPolicy):
+
+    async def permits(self, identity, permission, context=None):
+        return (type(permission), permission) in {(Article, Article.READ), (Role, Role.ADMIN)}
+
+    async def authorized_userid(self, identity):
+        return identity
+
+
+async def test_decisions_cached_per_permission_type(aiohttp_client):
+    # equal permissions of different types are decided separately
+
+    async def check(request):
+        assert await permits(request, Article.READ)
+        assert not await permits(request, Billing.ADMIN)
+        assert not await permits(request, 'admin')
+        assert await permits(request, Role.ADMIN)
+        return web.Response()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), TypedAutz())
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('POST', '/login', login)
+    client = await aiohttp_client(app)
+    await client.post('/login', allow_redirects=False)
+    assert 200 == (await client.get('/')).status
+
+
+@pytest.mark.parametrize('cache_decisions', [True, False])
+async def test_permits_many_per_permission_type(aiohttp_client, cache_decisions):
+
+    class BulkAutz(TypedAutz):
+
+        def __init__(self) -> None:
+            self.batches: list[list[object]] = []
+
+        async def permits_many(self, identity, permissions, context=None):
+            self.batches.append(list(permissions))
+            return await super().permits_many(identity, permissions, context)
+
+    async def check(request):
+        perms: list[str | enum.Enum] = [Article.READ, Billing.ADMIN, 'admin', Role.ADMIN,
+                                        Article.READ]
+        # entries of equal permissions are granted only if all of them are
+        assert {Article.READ: False, 'admin': False} == await permits_many(request, perms)
+        assert {Article.READ: True, Role.ADMIN: True} == await TypedAutz().permits_many(
+            'UserID', [Article.READ, Role.ADMIN])
+        await check_permissions(request, [Article.READ, Role.ADMIN])
+        await check_permissions(request, [Article.READ, Billing.ADMIN])
+        return web.Response()
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    app = web.Application()
+    autz = BulkAutz()
+    _setup(app, CookiesIdentityPolicy(), autz, cache_decisions=cache_decisions)
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('POST', '/login', login)
+    client = await aiohttp_client(app)
+    await client.post('/login', allow_redirects=False)
+
+    resp = await client.get('/')
+    assert 403 == resp.status
+    # no policy call is given equal permissions
+    assert [[Article.READ, 'admin'], [Billing.ADMIN, Role.ADMIN]] == autz.batches[:2]
+
+
+async def test_memos_per_policy():
+    # memos of one identity policy, or security context, are not reused
+    # by another one
+    from aiohttp.test_utils import make_mocked_request
+
+    from aiohttp_security.api import SecurityContext, _authorized_userid, _identify, _memoize
+
+    class FixedIdentityPolicy(CookiesIdentityPolicy):
+
+        def __init__(self, identity: str) -> None:
+            super().__init__()
+            self.identity = identity
+            self.calls = 0
+
+        async def identify(self, request):
+            self.calls += 1
+            return self.identity
+
+    parent_identity = FixedIdentityPolicy('UserID')
+    parent = SecurityContext(parent_identity, Autz(), None, None)
+    sub = SecurityContext(FixedIdentityPolicy('sub'), Autz(), None, None)
+    sibling = SecurityContext(parent_identity, Autz(), None, None)
+    request = make_mocked_request('GET', '/')
+
+    assert 'UserID' == await _identify(request, parent)
+    assert 'sub' == await _identify(request, sub)
+    assert 'UserID' == await _identify(request, sibling)
+    assert 1 == parent_identity.calls
+
+    assert 'Andrew' == await _memoize(request, parent.userid_key,
+                                      lambda: _authorized_userid(request, parent))
+    assert await _memoize(request, sub.userid_key,
+                          lambda: _authorized_userid(request, sub)) is None
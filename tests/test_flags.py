@@ -0,0 +1,93 @@
+import enum
+
+import jwt
+import pytest
+from aiohttp import web
+
+from aiohttp_security import (FlagAuthorizationPolicy, JWTIdentityPolicy, check_permission,
+                              load_flags, permits_many)
+from aiohttp_security import setup as _setup
+
+
+class Permission(enum.IntFlag):
+    READ = 1
+    WRITE = 2
+    DELETE = 4
+
+
+class Other(enum.IntFlag):
+    READ = 1
+
+
+@pytest.fixture
+def policy():
+    return FlagAuthorizationPolicy(Permission, {'alice': Permission.READ | Permission.WRITE,
+                                                'bob': 1, 'carol': 0})
+
+
+async def test_permits(policy):
+    assert await policy.permits('alice', Permission.WRITE)
+    assert await policy.permits('alice', Permission.READ | Permission.WRITE)
+    assert not await policy.permits('alice', Permission.WRITE | Permission.DELETE)
+    assert await policy.permits('bob', Permission.READ)
+    assert not await policy.permits('bob', Permission.WRITE)
+    assert not await policy.permits('carol', Permission.READ)
+    assert not await policy.permits('dave', Permission.READ)
+    assert not await policy.permits(None, Permission.READ)
+    assert not await policy.permits('alice', Other.READ)
+    assert not await policy.permits('alice', Permission(0))
+
+
+async def test_permits_by_name(policy):
+    assert await policy.permits('alice', 'WRITE')
+    assert not await policy.permits('alice', 'DELETE')
+    assert not await policy.permits('alice', 'UNKNOWN')
+
+
+async def test_permits_many(policy):
+    expected = {Permission.READ: True, 'WRITE': True, Permission.DELETE: False}
+    assert expected == await policy.permits_many('alice', expected)
+
+
+async def test_authorized_userid(policy):
+    assert 'carol' == await policy.authorized_userid('carol')
+    assert await policy.authorized_userid('dave') is None
+    assert Permission.READ | Permission.WRITE == policy.grants('alice')
+    assert Permission(0) == policy.grants('dave')
+
+
+def test_load_flags():
+    assert Permission.READ | Permission.DELETE == load_flags(Permission, 5)
+    assert isinstance(load_flags(Permission, 0), Permission)
+    with pytest.raises(ValueError, match='0x8'):
+        load_flags(Permission, 9)
+
+
+def test_invalid_grants():
+    with pytest.raises(ValueError):
+        FlagAuthorizationPolicy(Permission, {'alice': 8})
+    with pytest.raises(ValueError):
+        FlagAuthorizationPolicy(Permission, {'alice': Other.READ})
+
+
+async def test_grants_from_token(aiohttp_client):
+    # grants serialized as a claim, loaded by the application
+    secret = 'Key'  # noqa: S105
+
+    async def check(request):
+        await check_permission(request, Permission.READ | Permission.WRITE)
+        result = await permits_many(request, [Permission.DELETE])
+        return web.Response(text=str(result[Permission.DELETE]))
+
+    token = jwt.encode({'login': 'alice', 'grants': int(Permission.READ | Permission.WRITE)},
+                       secret)
+    claims = jwt.decode(token, secret, algorithms=['HS256'])
+    policy = FlagAuthorizationPolicy(Permission, {claims['login']: claims['grants']})
+
+    app = web.Application()
+    _setup(app, JWTIdentityPolicy(secret), policy)
+    app.router.add_route('GET', '/', check)
+    client = await aiohttp_client(app)
+    resp = await client.get('/', headers={'Authorization': 'Bearer ' + token})
+    assert 200 == resp.status
+    assert 'False' == await resp.text()
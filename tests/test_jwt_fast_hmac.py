@@ -0,0 +1,120 @@
+"""Differential tests of the fast HMAC verifier against jwt.decode()."""
+
+import base64
+import json
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Type, Union
+
+import jwt
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from aiohttp_security.jwt_identity import JWTIdentityPolicy
+
+SECRET = "Key"  # noqa: S105
+NOW = int(time.time())
+
+
+def _segment(data: object) -> str:
+    raw = json.dumps(data).encode() if not isinstance(data, bytes) else data
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _tamper(token: str) -> str:
+    head, _, signature = token.rpartition(".")
+    return "{}.{}".format(head, signature[::-1])
+
+
+def _unsigned(header: object, payload: object) -> str:
+    return "{}.{}.{}".format(_segment(header), _segment(payload), _segment(b"sig"))
+
+
+CLAIMS: List[Dict[str, object]] = [
+    {"login": "Andrew"},
+    {"login": "Andrew", "exp": NOW + 600},
+    {"login": "Andrew", "exp": NOW - 5},
+    {"login": "Andrew", "exp": NOW - 600},
+    {"login": "Andrew", "exp": float(NOW + 600)},
+    {"login": "Andrew", "exp": str(NOW + 600)},
+    {"login": "Andrew", "exp": "soon"},
+    {"login": "Andrew", "nbf": NOW - 600},
+    {"login": "Andrew", "nbf": NOW + 5},
+    {"login": "Andrew", "nbf": NOW + 600},
+    {"login": "Andrew", "nbf": "later"},
+    {"login": "Andrew", "iat": NOW},
+    {"login": "Andrew", "iat": NOW + 5},
+    {"login": "Andrew", "iat": NOW + 600},
+    {"login": "Andrew", "iat": "now"},
+    {"login": "Andrew", "aud": "service"},
+    {"login": "Andrew", "aud": []},
+    {"login": "Andrew", "iss": "issuer"},
+    {"login": "Andrew", "sub": "user"},
+    {"login": "Andrew", "sub": 42},
+    {"login": "Andrew", "jti": "id"},
+    {"login": "Andrew", "jti": 42},
+    {"login": 42},
+    {},
+]
+
+
+def _tokens(algorithm: str) -> Iterator[str]:
+    for claims in CLAIMS:
+        token = jwt.encode(claims, SECRET, algorithm=algorithm)
+        yield token
+        yield _tamper(token)
+        yield jwt.encode(claims, "Other", algorithm=algorithm)
+    token = jwt.encode({"login": "Andrew"}, SECRET, algorithm=algorithm)
+    yield token.rpartition(".")[0] + ".a"
+    yield token.rpartition(".")[0] + "."
+    yield jwt.encode({"login": "Andrew"}, SECRET, algorithm=algorithm,
+                     headers={"kid": "k1", "typ": "JWT"})
+    yield jwt.encode({"login": "Andrew"}, SECRET, algorithm=algorithm,
+                     headers={"cty": "JWT"})
+    yield _unsigned({"alg": algorithm}, [1])
+    yield _unsigned({"alg": algorithm}, b"not json")
+
+
+def _bearer(token: str) -> web.Request:
+    return make_mocked_request("GET", "/", headers={"Authorization": "Bearer " + token})
+
+
+async def _outcome(policy: JWTIdentityPolicy, request: web.Request
+                   ) -> Union[Optional[str], Tuple[Type[Exception], str]]:
+    try:
+        return await policy.identify(request)
+    except jwt.PyJWTError as exc:
+        return type(exc), str(exc)
+
+
+@pytest.mark.parametrize("leeway", [0, 10])
+@pytest.mark.parametrize("algorithm", ["HS256", "HS384", "HS512"])
+async def test_same_as_pyjwt(algorithm, leeway):
+    reference = JWTIdentityPolicy(SECRET, algorithm=algorithm, leeway=leeway)
+    fast = JWTIdentityPolicy(SECRET, algorithm=algorithm, leeway=leeway, fast_hmac=True)
+    for token in _tokens(algorithm):
+        request = _bearer(token)
+        assert await _outcome(reference, request) == await _outcome(fast, request), token
+
+
+async def test_fast_path_skips_pyjwt(mocker):
+    decode = mocker.spy(jwt, "decode")
+    policy = JWTIdentityPolicy(SECRET, fast_hmac=True)
+    token = jwt.encode({"login": "Andrew"}, SECRET)
+    assert "Andrew" == await policy.identify(_bearer(token))
+    assert not decode.called
+
+
+async def test_fast_path_key_set():
+    policy = JWTIdentityPolicy(keys={"k1": "Key1", "k2": "Key2"}, fast_hmac=True)
+    for kid, secret in (("k1", "Key1"), ("k2", "Key2"), ("k1", "Key1")):
+        token = jwt.encode({"login": kid}, secret, headers={"kid": kid})
+        assert kid == await policy.identify(_bearer(token))
+    token = jwt.encode({"login": "Andrew"}, "Key1", headers={"kid": "k2"})
+    with pytest.raises(jwt.InvalidSignatureError):
+        await policy.identify(_bearer(token))
+
+
+def test_fast_path_requires_hmac():
+    with pytest.raises(ValueError):
+        JWTIdentityPolicy(SECRET, algorithm="RS256", fast_hmac=True)
@@ -1,6 +1,15 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import jwt
 import pytest
 from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 
 from aiohttp_security import AbstractAuthorizationPolicy
 from aiohttp_security import setup as _setup
@@ -20,6 +29,18 @@ def make_token():
     return factory
 
 
+def _bearer(token: str) -> web.Request:
+    return make_mocked_request("GET", "/", headers={"Authorization": "Bearer " + token})
+
+
+@pytest.fixture(scope="module")
+def rsa_keys():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return private_key, public_pem.decode()
+
+
 class Autz(AbstractAuthorizationPolicy):
 
     async def permits(self, identity, permission, context=None):
@@ -105,3 +126,227 @@ async def test_identify_expired_signature(make_token, aiohttp_client):
     resp = await client.get("/", headers=headers)
     assert 400 == resp.status
     assert "Signature has expired" in resp.reason
+
+
+async def test_identify_cached(make_token, mocker):
+    secret = "Key"  # noqa: S105
+    policy = JWTIdentityPolicy(secret, cache_size=8)
+    decode = mocker.spy(jwt, "decode")
+    token = make_token({"login": "Andrew", "exp": int(time.time()) + 600}, secret)
+    request = make_mocked_request("GET", "/", headers={"Authorization": "Bearer " + token})
+
+    for _ in range(3):
+        assert "Andrew" == await policy.identify(request)
+    assert 1 == decode.call_count
+    info = policy.cache_info()
+    assert info is not None
+    assert (2, 1, 1) == (info.hits, info.misses, info.currsize)
+
+    other = make_token({"login": "Other"}, secret)
+    request = make_mocked_request("GET", "/", headers={"Authorization": "Bearer " + other})
+    assert "Other" == await policy.identify(request)
+    assert "Other" == await policy.identify(request)
+    assert 2 == decode.call_count
+
+
+async def test_identify_cache_evicts_at_exp(make_token, mocker):
+    secret = "Key"  # noqa: S105
+    policy = JWTIdentityPolicy(secret, cache_size=8, cache_ttl=30)
+    cache_set = mocker.spy(policy._cache, "set")
+    exp = int(time.time()) + 600
+    token = make_token({"login": "Andrew", "exp": exp}, secret)
+    assert "Andrew" == await policy.identify(_bearer(token))
+    (_, _, ttl), _ = cache_set.call_args
+    assert 590 < ttl <= 600
+
+    token = make_token({"login": "Andrew"}, secret)
+    assert "Andrew" == await policy.identify(_bearer(token))
+    (_, _, ttl), _ = cache_set.call_args
+    assert ttl is None
+
+
+async def test_identify_cache_disabled():
+    assert JWTIdentityPolicy("Key").cache_info() is None
+
+
+@pytest.mark.parametrize("algorithm,offloaded", [("RS256", True), ("HS256", False)])
+async def test_identify_offloaded_to_executor(rsa_keys, mocker, algorithm, offloaded):
+    private_key, public_pem = rsa_keys
+    if algorithm == "RS256":
+        token = jwt.encode({"login": "Andrew"}, private_key, algorithm=algorithm)
+        secret = public_pem
+    else:
+        secret = "Key"  # noqa: S105
+        token = jwt.encode({"login": "Andrew"}, secret, algorithm=algorithm)
+    request = make_mocked_request("GET", "/", headers={"Authorization": "Bearer " + token})
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        submit = mocker.spy(executor, "submit")
+        policy = JWTIdentityPolicy(secret, algorithm=algorithm, executor=executor)
+        assert "Andrew" == await policy.identify(request)
+    assert offloaded == submit.called
+
+
+def test_no_key_given():
+    with pytest.raises(ValueError):
+        JWTIdentityPolicy()
+    with pytest.raises(ValueError):
+        JWTIdentityPolicy(keys={}, jwks_file="keys.json")
+
+
+async def test_identify_key_set():
+    policy = JWTIdentityPolicy(keys={"k1": "Key1", "k2": "Key2"})
+    for kid, secret in (("k1", "Key1"), ("k2", "Key2")):
+        token = jwt.encode({"login": kid}, secret, headers={"kid": kid})
+        assert kid == await policy.identify(_bearer(token))
+
+    token = jwt.encode({"login": "Andrew"}, "Key1", headers={"kid": "k3"})
+    with pytest.raises(jwt.InvalidKeyError, match="Unknown key id 'k3'"):
+        await policy.identify(_bearer(token))
+    token = jwt.encode({"login": "Andrew"}, "Key1", headers={"kid": "k2"})
+    with pytest.raises(jwt.InvalidSignatureError):
+        await policy.identify(_bearer(token))
+    token = jwt.encode({"login": "Andrew"}, "Key1")
+    with pytest.raises(jwt.InvalidKeyError, match="Token has no key id"):
+        await policy.identify(_bearer(token))
+
+
+async def test_identify_key_set_fallback_secret():
+    policy = JWTIdentityPolicy("Key", keys={"k1": "Key1"})
+    token = jwt.encode({"login": "Andrew"}, "Key")
+    assert "Andrew" == await policy.identify(_bearer(token))
+
+
+async def test_identify_jwks_file_reload(tmp_path, rsa_keys):
+    private_key, public_pem = rsa_keys
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps({"keys": [dict(jwk, kid="old", alg="RS256")]}))
+
+    policy = JWTIdentityPolicy(algorithm="RS256", jwks_file=path, cache_size=8)
+    old = jwt.encode({"login": "Andrew"}, private_key, algorithm="RS256",
+                     headers={"kid": "old"})
+    new = jwt.encode({"login": "Andrew"}, private_key, algorithm="RS256",
+                     headers={"kid": "rotated"})
+    assert "Andrew" == await policy.identify(_bearer(old))
+    with pytest.raises(jwt.InvalidKeyError):
+        await policy.identify(_bearer(new))
+
+    path.write_text(json.dumps({"keys": [dict(jwk, kid="rotated", alg="RS256")]}))
+    await policy.reload_jwks()
+    assert "Andrew" == await policy.identify(_bearer(new))
+    # rotated out key is not served from the decoded tokens cache
+    with pytest.raises(jwt.InvalidKeyError):
+        await policy.identify(_bearer(old))
+
+    # a broken file does not break authentication
+    path.write_text("{")
+    await policy.reload_jwks()
+    assert "Andrew" == await policy.identify(_bearer(new))
+    await policy.close()
+
+
+async def test_jwks_file_watched_off_requests(tmp_path, mocker):
+    path = tmp_path / "jwks.json"
+    jwk = {"kty": "oct", "k": "S2V5", "alg": "HS256"}
+    path.write_text(json.dumps({"keys": [dict(jwk, kid="old")]}))
+    policy = JWTIdentityPolicy(jwks_file=path, reload_interval=0.01)
+    token = jwt.encode({"login": "Andrew"}, "Key", headers={"kid": "rotated"})
+
+    stat = mocker.spy(os, "stat")
+    with pytest.raises(jwt.InvalidKeyError):
+        await policy.identify(_bearer(token))
+    assert 0 == stat.call_count  # requests never touch the file
+
+    path.write_text(json.dumps({"keys": [dict(jwk, kid="rotated")]}))
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if "rotated" in (policy._keys or {}):
+            break
+    assert "Andrew" == await policy.identify(_bearer(token))
+    assert stat.call_count > 0
+
+    await policy.close()
+    assert policy._watcher is None
+
+
+async def test_jwks_watcher_closed_on_cleanup(tmp_path, aiohttp_client):
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps({"keys": [{"kty": "oct", "k": "S2V5", "kid": "k1"}]}))
+    policy = JWTIdentityPolicy(jwks_file=path, reload_interval=0.01)
+
+    async def check(request):
+        return web.Response(text=await policy.identify(request))
+
+    app = web.Application()
+    policy.close_on_cleanup(app)
+    app.router.add_route('GET', '/', check)
+    client = await aiohttp_client(app)
+    token = jwt.encode({"login": "Andrew"}, "Key", headers={"kid": "k1"})
+    resp = await client.get('/', headers={"Authorization": "Bearer {}".format(token)})
+    assert "Andrew" == await resp.text()
+    watcher = policy._watcher
+    assert watcher is not None and not watcher.done()
+
+    await client.close()
+    assert policy._watcher is None
+    assert watcher.cancelled()
+
+
+@pytest.mark.parametrize("token,error,message", [
+    ("a" * 9000, jwt.DecodeError, "Token is too long"),
+    ("abc", jwt.DecodeError, "Not enough segments"),
+    ("a.b.c.d", jwt.DecodeError, "Not enough segments"),
+    ("!!.e30.sig", jwt.DecodeError, "Invalid header string"),
+    ("W10.e30.sig", jwt.DecodeError, "Invalid header string: must be a json object"),
+    (jwt.encode({"login": "Andrew"}, "Key", algorithm="HS512"),
+     jwt.InvalidAlgorithmError, "The specified alg value is not allowed"),
+    (jwt.encode({"login": "Andrew"}, "", algorithm="none"),
+     jwt.InvalidAlgorithmError, "The specified alg value is not allowed"),
+    (jwt.encode({"login": "Andrew", "exp": 0}, "Other"),
+     jwt.ExpiredSignatureError, "Signature has expired"),
+])
+async def test_identify_rejected_before_verification(mocker, token, error, message):
+    policy = JWTIdentityPolicy("Key")
+    decode = mocker.spy(jwt, "decode")
+    with pytest.raises(error, match="^{}$".format(message)):
+        await policy.identify(_bearer(token))
+    assert not decode.called
+
+
+async def test_identify_extra_spaces():
+    token = jwt.encode({"login": "Andrew"}, "Key")
+    request = make_mocked_request("GET", "/", headers={"Authorization": "Bearer  " + token})
+    assert "Andrew" == await JWTIdentityPolicy("Key").identify(request)
+
+
+async def test_identify_negative_cache(mocker):
+    policy = JWTIdentityPolicy("Key", negative_cache_size=8)
+    decode = mocker.spy(jwt, "decode")
+    token = jwt.encode({"login": "Andrew"}, "Other")
+    for _ in range(3):
+        with pytest.raises(jwt.InvalidSignatureError, match="Signature verification failed"):
+            await policy.identify(_bearer(token))
+    assert 1 == decode.call_count
+    info = policy.negative_cache_info()
+    assert info is not None
+    assert (2, 1) == (info.hits, info.currsize)
+
+    token = jwt.encode({"login": "Andrew"}, "Key")
+    assert "Andrew" == await policy.identify(_bearer(token))
+    assert JWTIdentityPolicy("Key").negative_cache_info() is None
+
+
+async def test_identify_negative_cache_expires(mocker):
+    now = time.time()
+    policy = JWTIdentityPolicy("Key", negative_cache_size=8, negative_cache_ttl=5)
+    clock = mocker.patch.object(policy._rejected, "timer", return_value=now)
+    token = jwt.encode({"login": "Andrew", "nbf": int(now) + 2}, "Key")
+    with pytest.raises(jwt.ImmatureSignatureError):
+        await policy.identify(_bearer(token))
+
+    mocker.patch("jwt.api_jwt.datetime", **{"now.return_value.timestamp.return_value": now + 3})
+    with pytest.raises(jwt.ImmatureSignatureError):
+        await policy.identify(_bearer(token))
+    clock.return_value = now + 6
+    assert "Andrew" == await policy.identify(_bearer(token))
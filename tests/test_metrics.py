@@ -0,0 +1,124 @@
+from aiohttp import web
+
+from aiohttp_security import (AbstractAuthorizationPolicy, CachedAuthorizationPolicy,
+                              InMemoryMetrics, check_permission, forget, permits_many,
+                              remember)
+from aiohttp_security import setup as _setup
+from aiohttp_security.api import AUTZ_KEY, IDENTITY_KEY
+from aiohttp_security.cookies_identity import CookiesIdentityPolicy
+from aiohttp_security.metrics import metrics_handler, render_prometheus
+
+
+class Autz(AbstractAuthorizationPolicy):
+
+    async def permits(self, identity, permission, context=None):
+        if permission == 'fail':
+            raise RuntimeError('backend unavailable')
+        return identity == 'UserID' and permission == 'read'
+
+    async def authorized_userid(self, identity):
+        return 'Andrew' if identity == 'UserID' else None
+
+
+def _app(metrics: InMemoryMetrics) -> web.Application:
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'UserID')
+        raise response
+
+    async def check(request):
+        await check_permission(request, 'read')
+        assert {'read': True, 'write': False} == await permits_many(
+            request, ['read', 'write'])
+        return web.Response()
+
+    async def fail(request):
+        await check_permission(request, 'fail')
+        raise AssertionError('unreachable')
+
+    async def logout(request):
+        response = web.Response()
+        await forget(request, response)
+        return response
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), Autz(), metrics=metrics)
+    app.router.add_route('POST', '/login', login)
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('GET', '/fail', fail)
+    app.router.add_route('POST', '/logout', logout)
+    app.router.add_route('GET', '/metrics', metrics_handler(metrics))
+    return app
+
+
+async def test_calls_recorded(aiohttp_client):
+    metrics = InMemoryMetrics()
+    client = await aiohttp_client(_app(metrics))
+
+    await client.post('/login', allow_redirects=False)
+    assert 200 == (await client.get('/')).status
+    assert 500 == (await client.get('/fail')).status
+    assert 200 == (await client.post('/logout')).status
+
+    stats = metrics.stats()
+    assert {
+        ('CookiesIdentityPolicy', 'identify'): (2, 0),
+        ('CookiesIdentityPolicy', 'remember'): (1, 0),
+        ('CookiesIdentityPolicy', 'forget'): (1, 0),
+        ('Autz', 'authorized_userid'): (2, 0),
+        ('Autz', 'permits'): (2, 1),
+        ('Autz', 'permits_many'): (1, 0),
+    } == {key: (item.count, item.errors) for key, item in stats.items()}
+    identify = stats['CookiesIdentityPolicy', 'identify']
+    assert 2 == sum(identify.buckets)
+    assert identify.total > 0
+
+    metrics.reset()
+    assert {} == metrics.stats()
+
+
+async def test_prometheus_export(aiohttp_client):
+    metrics = InMemoryMetrics(buckets=(10.0, 0.5))
+    metrics.observe('Policy"A', 'permits', 0.1, False)
+    metrics.observe('Policy"A', 'permits', 1.0, True)
+    metrics.observe('Policy"A', 'permits', 20.0, False)
+
+    labels = 'policy="Policy\\"A",method="permits"'
+    assert render_prometheus(metrics) == '\n'.join([
+        '# HELP aiohttp_security_calls_total Security policy calls.',
+        '# TYPE aiohttp_security_calls_total counter',
+        'aiohttp_security_calls_total{%s} 3' % labels,
+        '# HELP aiohttp_security_errors_total Security policy calls that raised.',
+        '# TYPE aiohttp_security_errors_total counter',
+        'aiohttp_security_errors_total{%s} 1' % labels,
+        '# HELP aiohttp_security_call_duration_seconds Security policy call latency.',
+        '# TYPE aiohttp_security_call_duration_seconds histogram',
+        'aiohttp_security_call_duration_seconds_bucket{%s,le="0.5"} 1' % labels,
+        'aiohttp_security_call_duration_seconds_bucket{%s,le="10.0"} 2' % labels,
+        'aiohttp_security_call_duration_seconds_bucket{%s,le="+Inf"} 3' % labels,
+        'aiohttp_security_call_duration_seconds_sum{%s} 21.1' % labels,
+        'aiohttp_security_call_duration_seconds_count{%s} 3' % labels,
+    ]) + '\n'
+
+    client = await aiohttp_client(_app(metrics))
+    resp = await client.get('/metrics')
+    assert 200 == resp.status
+    assert resp.content_type == 'text/plain'
+    assert 'aiohttp_security_calls_total{%s} 3' % labels in await resp.text()
+
+
+def test_disabled_metrics_keep_policies():
+    identity_policy = CookiesIdentityPolicy()
+    autz_policy = Autz()
+    app = web.Application()
+    _setup(app, identity_policy, autz_policy)
+    assert app[IDENTITY_KEY] is identity_policy
+    assert app[AUTZ_KEY] is autz_policy
+
+
+def test_instrumented_policy_attributes():
+    cached = CachedAuthorizationPolicy(Autz())
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), cached, metrics=InMemoryMetrics())
+    assert app[AUTZ_KEY].cache_info() == cached.cache_info()  # type: ignore[attr-defined]
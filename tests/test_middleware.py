@@ -0,0 +1,264 @@
+import enum
+import re
+
+import pytest
+from aiohttp import web
+
+from aiohttp_security import (AbstractAuthorizationPolicy, FlagAuthorizationPolicy,
+                              authorized_userid, check_permission, permits, remember,
+                              requires, setup_middleware, setup_server_timing)
+from aiohttp_security import setup as _setup
+from aiohttp_security.api import TIMINGS_KEY, Timing
+from aiohttp_security.cookies_identity import CookiesIdentityPolicy
+from aiohttp_security.middleware import PathPrefixTrie
+
+
+class Autz(AbstractAuthorizationPolicy):
+
+    async def permits(self, identity, permission, context=None):
+        if identity == 'UserID':
+            return permission in {'read', 'write'} and context != 'forbidden'
+        else:
+            return False
+
+    async def authorized_userid(self, identity):
+        if identity == 'UserID':
+            return 'Andrew'
+        else:
+            return None
+
+
+async def login(request):
+    response = web.HTTPFound(location='/')
+    await remember(request, response, 'UserID')
+    raise response
+
+
+@requires('read')
+async def read(request):
+    return web.Response()
+
+
+@requires('forbid')
+async def forbid(request):
+    return web.Response()
+
+
+@requires('read', context='forbidden')
+async def read_forbidden(request):
+    return web.Response()
+
+
+async def public(request):
+    return web.Response()
+
+
+@requires('write')
+class WriteView(web.View):
+
+    async def post(self):
+        return web.Response()
+
+
+@pytest.fixture
+def make_app():
+    def factory(**kwargs):
+        app = web.Application()
+        _setup(app, CookiesIdentityPolicy(), Autz())
+        setup_middleware(app, **kwargs)
+        app.router.add_route('POST', '/login', login)
+        app.router.add_route('GET', '/read', read)
+        app.router.add_route('GET', '/forbid', forbid)
+        app.router.add_route('GET', '/read-forbidden', read_forbidden)
+        app.router.add_route('GET', '/public', public)
+        app.router.add_route('GET', '/named', public, name='named')
+        app.router.add_view('/write', WriteView)
+        subapp = web.Application()
+        subapp.router.add_route('GET', '/read', read)
+        app.add_subapp('/sub', subapp)
+        return app
+    return factory
+
+
+async def test_declared_permissions(make_app, aiohttp_client):
+    client = await aiohttp_client(make_app(permissions={'named': 'write'}))
+
+    for path in ('/read', '/forbid', '/named', '/sub/read'):
+        resp = await client.get(path)
+        assert web.HTTPUnauthorized.status_code == resp.status
+    resp = await client.post('/write')
+    assert web.HTTPUnauthorized.status_code == resp.status
+    resp = await client.get('/public')
+    assert web.HTTPOk.status_code == resp.status
+
+    await client.post('/login')
+    for path in ('/read', '/named', '/sub/read', '/public'):
+        resp = await client.get(path)
+        assert web.HTTPOk.status_code == resp.status
+    resp = await client.post('/write')
+    assert web.HTTPOk.status_code == resp.status
+    resp = await client.get('/forbid')
+    assert web.HTTPForbidden.status_code == resp.status
+    assert "User does not have 'forbid' permission" == resp.reason
+    resp = await client.get('/read-forbidden')
+    assert web.HTTPForbidden.status_code == resp.status
+
+
+async def startup(app: web.Application) -> None:
+    app.freeze()
+    await app.startup()
+
+
+async def test_unknown_route_name(make_app):
+    with pytest.raises(ValueError, match="Route 'unknown' is not registered."):
+        await startup(make_app(permissions={'unknown': 'read'}))
+
+
+async def test_invalid_permission(make_app):
+    with pytest.raises(ValueError, match="Permission should be a str or enum value."):
+        await startup(make_app(permissions={'named': ''}))
+
+
+async def test_security_not_initialized():
+    app = web.Application()
+    setup_middleware(app)
+    app.router.add_route('GET', '/read', read)
+    with pytest.raises(RuntimeError, match="Security subsystem is not initialized"):
+        await startup(app)
+
+
+@pytest.mark.parametrize("path,public", [
+    ('/static', True),
+    ('/static/', True),
+    ('/static/css/main.css', True),
+    ('/statics', False),
+    ('/health', True),
+    ('/health/live', True),
+    ('/api/v1/public/docs', True),
+    ('/api/v1/public', True),
+    ('/api/v1', False),
+    ('/api/v2/public', False),
+    ('/', False),
+    ('', False),
+])
+def test_path_prefix_trie(path, public):
+    trie = PathPrefixTrie(['/static', 'health/', '/api/v1/public'])
+    assert public == trie.match(path)
+
+
+def test_path_prefix_trie_root():
+    trie = PathPrefixTrie(['/'])
+    assert trie.match('/')
+    assert trie.match('/anything')
+    assert not PathPrefixTrie().match('/')
+
+
+async def test_public_paths(aiohttp_client):
+    identified = []
+
+    class IdentityPolicy(CookiesIdentityPolicy):
+
+        async def identify(self, request):
+            identified.append(request.path)
+            return await super().identify(request)
+
+    async def greet(request):
+        return web.Response(text=str(await authorized_userid(request)))
+
+    app = web.Application()
+    _setup(app, IdentityPolicy(), Autz())
+    setup_middleware(app, public_paths=['/static', '/health'])
+    app.router.add_route('POST', '/login', login)
+    app.router.add_route('GET', '/', greet)
+    app.router.add_route('GET', '/static/greet', greet)
+    app.router.add_route('GET', '/health', public)
+    app.router.add_route('GET', '/static/read', read)
+    client = await aiohttp_client(app)
+    await client.post('/login', allow_redirects=False)
+    identified.clear()
+
+    resp = await client.get('/health')
+    assert 200 == resp.status
+    resp = await client.get('/static/greet')
+    assert 'None' == await resp.text()
+    resp = await client.get('/static/read')
+    assert web.HTTPUnauthorized.status_code == resp.status
+    assert [] == identified
+
+    resp = await client.get('/')
+    assert 'Andrew' == await resp.text()
+    assert ['/'] == identified
+
+
+async def test_server_timing(aiohttp_client):
+    logged = []
+
+    class Permission(str, enum.Enum):
+        WRITE = 'write'
+
+    async def check(request):
+        assert await permits(request, 'read')
+        assert await permits(request, Permission.WRITE)
+        assert await permits(request, 'read')  # memoized, not timed again
+        logged.extend(request[TIMINGS_KEY])
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), Autz())
+    setup_middleware(app)
+    setup_server_timing(app)
+    app.router.add_route('POST', '/login', login)
+    app.router.add_route('GET', '/', check)
+    app.router.add_route('GET', '/forbid', forbid)
+    app.router.add_route('GET', '/public', public)
+    client = await aiohttp_client(app)
+    await client.post('/login', allow_redirects=False)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert ['identify', 'permits', 'permits'] == [t.name for t in logged]
+    assert ['', 'read', 'WRITE'] == [t.description for t in logged]
+    assert all(isinstance(t, Timing) and t.duration >= 0 for t in logged)
+    metric = r'(\w+);dur=\d+\.\d{3}(?:;desc="(\w*)")?'
+    header = resp.headers['Server-Timing']
+    assert re.fullmatch(', '.join([metric] * 3), header)
+    assert [('identify', ''), ('permits', 'read'), ('permits', 'WRITE')] == (
+        re.findall(metric, header))
+
+    # permission checked by the security middleware, request denied
+    resp = await client.get('/forbid')
+    assert 403 == resp.status
+    assert ['identify', 'authorized_userid', 'permits'] == (
+        [name for name, _ in re.findall(metric, resp.headers['Server-Timing'])])
+
+    resp = await client.get('/public')
+    assert 200 == resp.status
+    assert 'Server-Timing' not in resp.headers
+
+
+async def test_server_timing_flags(aiohttp_client):
+
+    class Permission(enum.IntFlag):
+        READ = 1
+        WRITE = 2
+
+    async def check(request):
+        await check_permission(request, Permission.READ | Permission.WRITE)
+        # a flag with an unnamed bit has no name on any Python version
+        assert not await permits(request, Permission(4))
+        return web.Response()
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(),
+           FlagAuthorizationPolicy(Permission, {'UserID': Permission.READ | Permission.WRITE}))
+    setup_server_timing(app)
+    app.router.add_route('POST', '/login', login)
+    app.router.add_route('GET', '/', check)
+    client = await aiohttp_client(app)
+    await client.post('/login', allow_redirects=False)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    descriptions = re.findall(r'permits;dur=[\d.]+;desc="([^"]+)"',
+                              resp.headers['Server-Timing'])
+    assert 2 == len(descriptions)
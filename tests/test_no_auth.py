@@ -1,7 +1,7 @@
 import pytest
 from aiohttp import web
 
-from aiohttp_security import authorized_userid, check_permission, permits
+from aiohttp_security import authorized_userid, check_permission, permits, permits_many
 
 
 async def test_authorized_userid(aiohttp_client):
@@ -27,6 +27,8 @@ async def test_permits(aiohttp_client):
         assert ret
         ret = await permits(request, 'unknown')
         assert ret
+        many = await permits_many(request, ['read', 'unknown'])
+        assert {'read': True, 'unknown': True} == many
         return web.Response()
 
     app = web.Application()
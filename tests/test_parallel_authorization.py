@@ -0,0 +1,146 @@
+import asyncio
+import enum
+import logging
+from typing import Dict, List, Optional
+
+import pytest
+
+from aiohttp_security import AbstractAuthorizationPolicy, ParallelAuthorizationPolicy
+
+
+class Autz(AbstractAuthorizationPolicy):
+
+    def __init__(self, granted: Dict[str, List[str]], delay: float = 0,
+                 error: Optional[Exception] = None) -> None:
+        self.granted = granted
+        self.delay = delay
+        self.error = error
+        self.cancelled = False
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+
+    async def permits(self, identity, permission, context=None):
+        await self._wait()
+        return permission in self.granted.get(identity, ())
+
+    async def authorized_userid(self, identity):
+        await self._wait()
+        return identity if identity in self.granted else None
+
+
+SLOW = 10
+
+
+async def test_any_short_circuits():
+    slow = Autz({'Andrew': ['read']}, delay=SLOW)
+    policy = ParallelAuthorizationPolicy(Autz({'Andrew': ['read']}), slow)
+    assert await asyncio.wait_for(policy.permits('Andrew', 'read'), 1)
+    assert 'Andrew' == await asyncio.wait_for(policy.authorized_userid('Andrew'), 1)
+    await asyncio.sleep(0)
+    assert slow.cancelled
+
+
+async def test_any_waits_for_grant():
+    policy = ParallelAuthorizationPolicy(Autz({'Andrew': []}), Autz({'Andrew': ['read']}, 0.01))
+    assert await policy.permits('Andrew', 'read')
+    assert not await policy.permits('Andrew', 'write')
+    assert await policy.authorized_userid('Bob') is None
+
+
+async def test_all_short_circuits():
+    slow = Autz({'Andrew': ['read']}, delay=SLOW)
+    policy = ParallelAuthorizationPolicy(Autz({'Andrew': []}), slow, mode='all')
+    assert not await asyncio.wait_for(policy.permits('Andrew', 'read'), 1)
+    await asyncio.sleep(0)
+    assert slow.cancelled
+
+
+async def test_all_requires_every_grant():
+    policy = ParallelAuthorizationPolicy(Autz({'Andrew': ['read', 'write']}),
+                                         Autz({'Andrew': ['read']}, 0.01), mode='all')
+    assert await policy.permits('Andrew', 'read')
+    assert not await policy.permits('Andrew', 'write')
+    assert 'Andrew' == await policy.authorized_userid('Andrew')
+    assert await policy.authorized_userid('Bob') is None
+
+
+@pytest.mark.parametrize('mode,expected', [
+    ('any', {'read': True, 'write': True, 'admin': False}),
+    ('all', {'read': True, 'write': False, 'admin': False}),
+])
+async def test_permits_many(mode, expected):
+    policy = ParallelAuthorizationPolicy(Autz({'Andrew': ['read', 'write']}),
+                                         Autz({'Andrew': ['read']}, 0.01), mode=mode)
+    assert expected == await policy.permits_many('Andrew', ['read', 'write', 'admin'])
+
+
+class LooseAutz(Autz):
+
+    async def permits_many(self, identity, permissions, context=None):
+        await self._wait()
+        granted = self.granted.get(identity, ())
+        return {p: 1 if p in granted else None for p in permissions}
+
+
+@pytest.mark.parametrize('mode,granted,expected', [
+    ('any', ['read'], True),
+    ('all', [], False),
+])
+async def test_permits_many_short_circuits_on_truthy(mode, granted, expected):
+    slow = Autz({'Andrew': ['read']}, delay=SLOW)
+    policy = ParallelAuthorizationPolicy(LooseAutz({'Andrew': granted}), slow, mode=mode)
+    result = await asyncio.wait_for(policy.permits_many('Andrew', ['read']), 1)
+    assert {'read': expected} == result
+    await asyncio.sleep(0)
+    assert slow.cancelled
+
+
+async def test_permits_many_per_permission_type():
+    class Role(str, enum.Enum):
+        READ = 'read'
+
+    class RoleAutz(Autz):
+
+        async def permits(self, identity, permission, context=None):
+            return not isinstance(permission, Role)
+
+    policy = ParallelAuthorizationPolicy(RoleAutz({}), mode='all')
+    assert {'read': True} == await policy.permits_many('Andrew', ['read'])
+    assert {'read': False} == await policy.permits_many('Andrew', ['read', Role.READ])
+
+
+async def test_timeout_denies(caplog):
+    slow = Autz({'Andrew': ['read']}, delay=SLOW)
+    policy = ParallelAuthorizationPolicy(Autz({'Andrew': []}), slow, timeouts=[None, 0.01])
+    with caplog.at_level(logging.WARNING):
+        assert not await asyncio.wait_for(policy.permits('Andrew', 'read'), 1)
+    assert slow.cancelled
+    assert 'Autz did not answer in 0.01 seconds' in caplog.text
+
+
+async def test_error_cancels_others():
+    slow = Autz({'Andrew': ['read']}, delay=SLOW)
+    failing = Autz({}, error=RuntimeError('unavailable'))
+    policy = ParallelAuthorizationPolicy(failing, slow)
+    with pytest.raises(RuntimeError):
+        await policy.permits('Andrew', 'read')
+    await asyncio.sleep(0)
+    assert slow.cancelled
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        ParallelAuthorizationPolicy()
+    with pytest.raises(ValueError):
+        ParallelAuthorizationPolicy(object())  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        ParallelAuthorizationPolicy(Autz({}), mode='most')
+    with pytest.raises(ValueError):
+        ParallelAuthorizationPolicy(Autz({}), timeouts=[1, 2])
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import threading
+import time
+from typing import List
+
+import pytest
+from aiohttp import web
+
+from aiohttp_security import (AbstractAuthorizationPolicy, SlowCallProfiler,
+                              check_permission, permits, remember)
+from aiohttp_security import setup as _setup
+from aiohttp_security.cookies_identity import CookiesIdentityPolicy
+
+
+async def query_database(delay: float) -> bool:
+    await asyncio.sleep(delay)
+    return True
+
+
+class SlowAutz(AbstractAuthorizationPolicy):
+
+    async def permits(self, identity, permission, context=None):
+        if permission == 'slow':
+            return await query_database(0.05)
+        if permission == 'blocking':
+            time.sleep(0.03)
+        return True
+
+    async def authorized_userid(self, identity):
+        return identity
+
+
+@pytest.fixture
+def make_client(aiohttp_client, tmp_path):
+    async def factory(**kwargs):
+
+        async def login(request):
+            response = web.HTTPFound(location='/')
+            await remember(request, response, 'UserID')
+            raise response
+
+        async def check(request):
+            await check_permission(request, request.match_info['permission'])
+            return web.Response()
+
+        profiler = SlowCallProfiler(str(tmp_path), threshold=0.02, interval=0.005,
+                                    **kwargs)
+        app = web.Application()
+        _setup(app, CookiesIdentityPolicy(), SlowAutz(), profiler=profiler)
+        app.router.add_route('POST', '/login', login)
+        app.router.add_route('GET', '/{permission}', check)
+        client = await aiohttp_client(app)
+        await client.post('/login', allow_redirects=False)
+        return client, profiler
+    return factory
+
+
+async def _reports(profiler: SlowCallProfiler, path: 'os.PathLike[str]') -> List[str]:
+    await profiler.flush()
+    return sorted(os.listdir(path))
+
+
+async def test_fast_calls_not_reported(make_client, tmp_path):
+    client, profiler = await make_client()
+    assert 200 == (await client.get('/read')).status
+    assert [] == await _reports(profiler, tmp_path)
+
+
+async def test_slow_call_sampled(make_client, tmp_path):
+    client, profiler = await make_client()
+    assert 200 == (await client.get('/slow')).status
+
+    [name] = await _reports(profiler, tmp_path)
+    assert name.startswith('slow-') and name.endswith('-SlowAutz.permits.txt')
+    report = (tmp_path / name).read_text()
+    assert report.startswith("call: SlowAutz.permits('slow')\n")
+    assert 'request: GET /slow\n' in report
+    assert 'in query_database' in report
+    assert ' sample(s):\n  File ' in report
+
+
+async def test_blocking_call_reported(make_client, tmp_path):
+    client, profiler = await make_client()
+    assert 200 == (await client.get('/blocking')).status
+
+    [name] = await _reports(profiler, tmp_path)
+    assert 'no samples: the event loop was blocked' in (tmp_path / name).read_text()
+
+
+async def test_reports_ring(make_client, tmp_path):
+    client, profiler = await make_client(max_files=2, max_samples=1)
+    for _ in range(3):
+        assert 200 == (await client.get('/slow')).status
+    reports = await _reports(profiler, tmp_path)
+    assert 2 == len(reports)
+    assert 'samples: 1,' in (tmp_path / reports[0]).read_text()
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        SlowCallProfiler(str(tmp_path), threshold=0)
+    with pytest.raises(ValueError):
+        SlowCallProfiler(str(tmp_path), max_files=0)
+
+
+async def test_profiler_inherited_by_subapp(aiohttp_client, tmp_path):
+
+    async def check(request):
+        assert await permits(request, 'slow')
+        return web.Response()
+
+    profiler = SlowCallProfiler(str(tmp_path), threshold=0.02)
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), SlowAutz(), profiler=profiler)
+    subapp = web.Application()
+    _setup(subapp, CookiesIdentityPolicy(), SlowAutz())
+    subapp.router.add_route('GET', '/', check)
+    app.add_subapp('/sub', subapp)
+    client = await aiohttp_client(app)
+
+    assert 200 == (await client.get('/sub/')).status
+    [name] = await _reports(profiler, tmp_path)
+    assert 'request: GET /sub/\n' in (tmp_path / name).read_text()
+
+
+async def test_report_written_off_loop(make_client, tmp_path):
+    client, profiler = await make_client()
+    threads = []
+    write = profiler._write
+
+    def spy(filename, report):
+        threads.append(threading.current_thread())
+        write(filename, report)
+
+    profiler._write = spy
+    assert 200 == (await client.get('/slow')).status
+    assert 1 == len(await _reports(profiler, tmp_path))
+    assert [threading.current_thread()] != threads and 1 == len(threads)
@@ -0,0 +1,99 @@
+import enum
+from typing import Dict, List, Union
+
+import pytest
+from aiohttp import web
+
+from aiohttp_security import (CookiesIdentityPolicy, RBACAuthorizationPolicy,
+                              check_permission, permits_many, remember)
+from aiohttp_security import setup as _setup
+
+
+class Permission(str, enum.Enum):
+    PUBLISH = 'publish'
+
+
+ROLES: Dict[str, List[Union[str, enum.Enum]]] = {
+    'reader': ['read'],
+    'writer': ['write'],
+    'editor': [Permission.PUBLISH],
+    'admin': ['delete'],
+}
+INHERITS = {'editor': ['writer'], 'writer': ['reader'], 'admin': ['editor']}
+GROUPS = {'staff': ['editor'], 'ops': ['admin']}
+USERS = {'alice': ['reader'], 'bob': ['staff'], 'carol': ['ops', 'reader'], 'dave': []}
+
+
+@pytest.fixture
+def policy():
+    return RBACAuthorizationPolicy(ROLES, USERS, inherits=INHERITS, groups=GROUPS)
+
+
+async def test_permits(policy):
+    assert await policy.permits('alice', 'read')
+    assert not await policy.permits('alice', 'write')
+    assert await policy.permits('bob', 'read')
+    assert await policy.permits('bob', Permission.PUBLISH)
+    assert await policy.permits('bob', 'publish')
+    assert not await policy.permits('bob', 'delete')
+    assert await policy.permits('carol', 'delete')
+    assert not await policy.permits('dave', 'read')
+    assert not await policy.permits('erin', 'read')
+    assert not await policy.permits(None, 'read')
+    assert not await policy.permits('carol', 'unknown')
+
+
+async def test_authorized_userid(policy):
+    assert 'dave' == await policy.authorized_userid('dave')
+    assert await policy.authorized_userid('erin') is None
+
+
+async def test_permits_many(policy):
+    expected = {'read': True, 'write': True, 'delete': False, 'unknown': False}
+    assert expected == await policy.permits_many('bob', ['read', 'write', 'delete', 'unknown'])
+
+
+def test_effective_permissions(policy):
+    assert {'read', 'write', 'publish', 'delete'} == policy.effective_permissions('carol')
+    assert frozenset() == policy.effective_permissions('erin')
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'inherits': {'reader': ['nobody']}},
+    {'inherits': {'nobody': ['reader']}},
+    {'inherits': {'reader': ['admin'], 'admin': ['reader']}},
+    {'groups': {'staff': ['nobody']}},
+    {'groups': {'reader': ['reader']}},
+])
+def test_invalid_roles(kwargs):
+    with pytest.raises(ValueError):
+        RBACAuthorizationPolicy(ROLES, {}, **kwargs)
+
+
+def test_unknown_user_role():
+    with pytest.raises(ValueError, match='nobody'):
+        RBACAuthorizationPolicy(ROLES, {'alice': ['nobody']})
+
+
+async def test_with_api(aiohttp_client, policy):
+
+    async def login(request):
+        response = web.HTTPFound(location='/')
+        await remember(request, response, 'bob')
+        raise response
+
+    async def check(request):
+        await check_permission(request, 'write')
+        return web.json_response(await permits_many(request, ['read', 'delete']))
+
+    app = web.Application()
+    _setup(app, CookiesIdentityPolicy(), policy)
+    app.router.add_route('POST', '/login', login)
+    app.router.add_route('GET', '/', check)
+    client = await aiohttp_client(app)
+
+    assert 401 == (await client.get('/')).status
+    await client.post('/login')
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert {'read': True, 'delete': False} == await resp.json()
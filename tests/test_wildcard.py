@@ -0,0 +1,60 @@
+import enum
+
+import pytest
+
+from aiohttp_security import PermissionTrie, WildcardAuthorizationPolicy
+
+
+class Permission(enum.Enum):
+    READ_ARTICLE = 'articles:1:read'
+
+
+class Code(enum.IntEnum):
+    READ = 1
+
+
+@pytest.mark.parametrize('grants,permission,expected', [
+    (['articles:read'], 'articles:read', True),
+    (['articles:read'], 'articles:write', False),
+    (['articles:read'], 'articles', False),
+    (['articles:read'], 'articles:read:all', False),
+    (['articles:*:read'], 'articles:42:read', True),
+    (['articles:*:read'], 'articles:42:write', False),
+    (['articles:*:read'], 'articles:42:read:all', False),
+    (['articles:*:read'], 'articles:read', False),
+    (['billing:*'], 'billing:invoices', True),
+    (['billing:*'], 'billing:invoices:42:read', True),
+    (['billing:*'], 'billing', False),
+    (['billing:*'], 'users:read', False),
+    (['*'], 'anything:at:all', True),
+    (['*:read'], 'billing:read', True),
+    (['a:*:c', 'a:b:d'], 'a:b:d', True),
+    (['a:*:c', 'a:b:d'], 'a:b:c', True),
+    (['a:*:c', 'a:b:d'], 'a:b:e', False),
+    ([], 'articles:read', False),
+])
+def test_matches(grants, permission, expected):
+    assert expected == PermissionTrie(grants).matches(permission)
+
+
+def test_separator_and_enum():
+    trie = PermissionTrie(['articles.*.read'], separator='.')
+    assert trie.matches('articles.1.read')
+    assert not trie.matches('articles:1:read')
+    assert PermissionTrie(['articles:*:read']).matches(Permission.READ_ARTICLE)
+    assert not PermissionTrie(['*']).matches(Code.READ)
+
+
+async def test_policy():
+    policy = WildcardAuthorizationPolicy({'alice': ['articles:*:read', 'billing:*'],
+                                          'bob': []})
+    assert await policy.permits('alice', 'billing:invoices:pay')
+    assert not await policy.permits('bob', 'billing:invoices:pay')
+    assert not await policy.permits(None, 'billing:invoices:pay')
+    assert not await policy.permits('alice', Code.READ)
+    assert 'bob' == await policy.authorized_userid('bob')
+    assert await policy.authorized_userid('carol') is None
+    expected = {'articles:1:read': True, 'articles:1:write': False}
+    assert expected == await policy.permits_many('alice', expected)
+    assert {'articles:1:read': False} == await policy.permits_many('carol',
+                                                                   ['articles:1:read'])